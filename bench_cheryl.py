@@ -0,0 +1,262 @@
+"""Benchmarks for the hot paths of cheryl
+
+Times Game.filter, Game.filter_chain, Game.get_solution, sample_candidates
+and find_game over a sweep of problem sizes, writes the timings to a JSON
+file and compares them against a stored baseline.
+
+Usage
+-----
+    python bench_cheryl.py                      # run and compare
+    python bench_cheryl.py --save-baseline      # run and store as baseline
+    python bench_cheryl.py --quick              # smaller sweep
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+
+from cheryl import (Game, Statement, Knows, LRUCache, find_game,
+                    sample_candidates, NoGameFoundError, np)
+
+
+NAMES = ['Albert', 'Bernard', 'Carl', 'Denise']
+
+ENGINES = ['python', 'bitset'] + (['numpy'] if np is not None else [])
+
+# differences below this many seconds are treated as noise
+NOISE_FLOOR = 1e-4
+
+
+def time_call(func, repeat):
+    """Get the best wall time of calling a function, in seconds"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def make_game(n_candidates, n_players, engine, seed=0):
+    """Sample a game with values that are shared by a few candidates each"""
+    n_values = max(2, int(round(2 * n_candidates ** 0.5)))
+    domains = [range(n_values) for _ in range(n_players)]
+    candidates = sample_candidates(domains, n_candidates,
+                                   rng=random.Random(seed))
+    return Game(candidates, player_names=NAMES[:n_players], engine=engine)
+
+
+def make_statement(fact_type, n_players, author=0):
+    """Make a statement about knowledge of a given type
+
+    fact_type is one of 'plain' (the author and one other player do not
+    know), 'tuple' (at least one of the other players does not know) and
+    'maybe' (the author does not know, the others maybe know).
+    """
+    names = NAMES[:n_players]
+    author_name = names[author]
+    others = [name for name in names if name != author_name]
+
+    if fact_type == 'plain':
+        facts = {author_name: Knows.no, others[0]: Knows.no}
+    elif fact_type == 'tuple':
+        facts = {author_name: Knows.no, tuple(others): Knows.no}
+    elif fact_type == 'maybe':
+        facts = {author_name: Knows.no}
+        facts.update((name, Knows.maybe) for name in others)
+    else:
+        raise ValueError(fact_type)
+
+    return Statement(author=author_name, facts=facts)
+
+
+def make_chain(length, n_players):
+    """Make a chain of 'I do not know' statements, taking turns"""
+    names = NAMES[:n_players]
+    return [Statement(author=names[i % n_players],
+                      facts={names[i % n_players]: Knows.no})
+            for i in range(length)]
+
+
+def readme_puzzles():
+    """The puzzles from the README, with their statements"""
+
+    birthday = (
+        [('May', 15), ('May', 16), ('May', 19), ('June', 17), ('June', 18),
+         ('July', 14), ('July', 16), ('Aug', 14), ('Aug', 15), ('Aug', 17)],
+        ['Albert', 'Bernard'],
+        [Statement(author='Albert',
+                   facts={'Albert': Knows.no, 'Bernard': Knows.no}),
+         Statement(author='Bernard', facts={'Bernard': Knows.yes}),
+         Statement(author='Albert', facts={'Albert': Knows.yes})]
+        )
+
+    rounds = (
+        [(1970, 'May', 19), (1970, 'July', 18), (1971, 'May', 19),
+         (1971, 'July', 19), (1973, 'May', 18), (1973, 'June', 18),
+         (1973, 'Aug', 16), (1973, 'Aug', 18), (1974, 'June', 18),
+         (1974, 'Sept', 18)],
+        NAMES[:3],
+        make_chain(9, 3) +
+        [Statement(author='Albert', facts={'Albert': Knows.yes})]
+        )
+
+    maybe = (
+        [(1970, 'Aug', 16), (1970, 'July', 15), (1970, 'Sept', 18),
+         (1971, 'Aug', 15), (1971, 'Aug', 17), (1972, 'Sept', 17),
+         (1973, 'July', 15), (1973, 'May', 17), (1974, 'July', 19),
+         (1974, 'Sept', 15)],
+        NAMES[:3],
+        [Statement(author='Albert', facts={'Albert': Knows.no,
+                                           ('Bernard', 'Carl'): Knows.maybe}),
+         Statement(author='Bernard', facts={'Bernard': Knows.no,
+                                            ('Albert', 'Carl'): Knows.maybe}),
+         Statement(author='Carl', facts={'Carl': Knows.no,
+                                         ('Albert', 'Bernard'): Knows.maybe}),
+         Statement(author='Albert', facts={'Albert': Knows.yes}),
+         Statement(author='Bernard', facts={'Bernard': Knows.yes}),
+         Statement(author='Carl', facts={'Carl': Knows.yes})]
+        )
+
+    return {'birthday': birthday, 'rounds': rounds, 'maybe': maybe}
+
+
+def cases(quick=False):
+    """Generate (name, function) pairs for all benchmarks"""
+
+    sizes = [100, 1000] if quick else [100, 1000, 10000]
+    players = [2, 3] if quick else [2, 3, 4]
+    lengths = [3, 9] if quick else [3, 9, 15]
+
+    for engine in ENGINES:
+        for n_candidates in sizes:
+            for n_players in players:
+                game = make_game(n_candidates, n_players, engine)
+                for fact_type in ['plain', 'tuple', 'maybe']:
+                    statement = make_statement(fact_type, n_players)
+                    name = 'filter/{}/n={}/p={}/{}'.format(
+                            engine, n_candidates, n_players, fact_type)
+                    yield name, lambda g=game, s=statement: g.n_solutions([s])
+
+                for length in lengths:
+                    chain = make_chain(length, n_players)
+                    name = 'filter_chain/{}/n={}/p={}/len={}'.format(
+                            engine, n_candidates, n_players, length)
+                    yield name, lambda g=game, c=chain: g.n_solutions(c)
+
+        for puzzle, (candidates, names, statements) in readme_puzzles().items():
+            game = Game(candidates, player_names=names, engine=engine)
+            name = 'get_solution/{}/{}'.format(engine, puzzle)
+            yield name, lambda g=game, s=statements: g.get_solution(s)
+
+    for n_candidates in sizes:
+        domains = [range(100)] * 3
+        name = 'sample_candidates/n={}'.format(n_candidates)
+        yield name, lambda d=domains, n=n_candidates: sample_candidates(
+                d, n, rng=random.Random(0))
+
+    domains = [range(1970, 1975), ['May', 'June', 'July', 'Aug', 'Sept'],
+               range(15, 20)]
+    statements = readme_puzzles()['maybe'][2]
+    n_tries = 200 if quick else 1000
+    modes = [('serial', {})]
+    if np is not None:
+        modes.append(('batched', {'batch_size': 250}))
+
+    for mode, kwargs in modes:
+        name = 'find_game/{}/tries={}'.format(mode, n_tries)
+        yield name, lambda k=kwargs: _find_game_quietly(
+                domains, 10, statements, n_tries, NAMES[:3], **k)
+
+    # the cache is shared between the repeats of a benchmark, so repeats
+    # after the first find every game in it
+    chain = make_chain(12, 3)
+    for n_values in [2, 5]:
+        domains = [range(n_values)] * 3
+        for mode in ['uncached', 'cached']:
+            cache = LRUCache(maxsize=10000) if mode == 'cached' else None
+            name = 'find_game/{}/values={}/tries={}'.format(mode, n_values,
+                                                            n_tries)
+            yield name, lambda d=domains, c=cache: _find_game_quietly(
+                    d, 6, chain, n_tries, NAMES[:3], cache=c)
+
+
+def _find_game_quietly(*args, **kwargs):
+    """Call find_game, treating not finding a game as a normal outcome"""
+    try:
+        find_game(*args, **kwargs)
+    except NoGameFoundError:
+        pass
+
+
+def compare(results, baseline, tolerance):
+    """Compare timings against a baseline
+
+    Returns
+    -------
+    A list of (name, baseline seconds, seconds) for all benchmarks that got
+    slower by more than the tolerance, and by more than NOISE_FLOOR.
+    """
+    regressions = []
+    for name, seconds in sorted(results.items()):
+        if name not in baseline:
+            continue
+        ratio = seconds / baseline[name]
+        flag = ''
+        if ratio > 1 + tolerance and seconds - baseline[name] > NOISE_FLOOR:
+            flag = '  <-- slower'
+            regressions.append((name, baseline[name], seconds))
+        print('{:<55} {:>10.6f} {:>10.6f} {:>6.2f}x{}'.format(
+                name, baseline[name], seconds, ratio, flag))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--output', default='bench_results.json',
+                        help='where to write the timings')
+    parser.add_argument('--baseline', default='bench_baseline.json',
+                        help='the timings to compare against')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='store the timings as the new baseline')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='number of runs per benchmark, best is kept')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='slowdown relative to baseline that is reported')
+    parser.add_argument('--quick', action='store_true',
+                        help='run a smaller sweep')
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name, func in cases(quick=args.quick):
+        results[name] = time_call(func, args.repeat)
+        print('{:<55} {:>10.6f}'.format(name, results[name]))
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        return 0
+
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except IOError:
+        print('\nNo baseline found at {}'.format(args.baseline))
+        return 0
+
+    print('\n{:<55} {:>10} {:>10}'.format('', 'baseline', 'now'))
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print('\n{} benchmarks got slower'.format(len(regressions)))
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
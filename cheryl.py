@@ -1,10 +1,20 @@
 """Classes for finding and solving puzzles like Cheryl's birthday puzzle"""
 
 from enum import Enum
-from collections import Counter
+from collections import Counter, OrderedDict
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 from functools import partial
+from itertools import islice, permutations, product
 from operator import itemgetter
 import random
+import sys
+import time
+
+# numpy is imported by `_import_numpy` when the numpy engine or batched
+# find_game is first used, so that other users do not pay for importing it
+np = None
 
 
 class Player(object):
@@ -19,11 +29,13 @@ class Player(object):
         at zero.
     """
 
+    __slots__ = ('name', 'index')
+
     def __init__(self, name, index):
         self.name = name
         self.index = index
 
-    def get_compatible(self, truth, candidates):
+    def get_compatible(self, truth, candidates, value_index=None):
         """Given a possible truth, get all candidates that would be compatible
 
         Parameters
@@ -32,14 +44,26 @@ class Player(object):
             The candidate to be considered as the possible truth.
         candidates: list of tuples
             All candidates that are still in play.
+        value_index: list of dicts
+            If given, an index of the candidates as built by
+            `build_value_index`, which is used instead of scanning the
+            candidates.
 
         Returns
         -------
         A list of candidates that are compatible with this possible truth.
         """
+        if _stats is not None:
+            _stats.get_compatible_calls += 1
+            if value_index is None:
+                _stats.candidates_scanned += len(candidates)
+
+        if value_index is not None:
+            return value_index[self.index][truth[self.index]]
+
         return [e for e in candidates if e[self.index] == truth[self.index]]
 
-    def would_know(self, truths, candidates):
+    def would_know(self, truths, candidates, value_index=None):
         """Given a list of possible truths, would the player know the solution?
 
         If the player knows the solution for all given truths, then the player
@@ -53,16 +77,23 @@ class Player(object):
             truth.
         candidates: list of tuples
             All candidates that are still in play.
+        value_index: list of dicts
+            If given, an index of the candidates as built by
+            `build_value_index`.
 
         Returns
         -------
         A Knows enum value, one of Knows.yes, Knows.maybe, and Knows.no.
         """
 
+        if _stats is not None:
+            _stats.would_know_calls += 1
+
         cases = []
         for truth in truths:
             compatibles = self.get_compatible(truth=truth, 
-                                              candidates=candidates)
+                                              candidates=candidates,
+                                              value_index=value_index)
             cases.append(knows(compatibles))
 
         return knows_cases(cases)
@@ -114,6 +145,211 @@ def _format_candidate(cand, widths):
     return ' '.join(parts)
 
 
+def build_value_index(candidates, n_dims):
+    """Index candidates by the value they take on in each dimension
+
+    Parameters
+    ----------
+    candidates: iterable of tuples
+        The candidate tuples to index.
+    n_dims: int
+        The number of dimensions of each candidate tuple.
+
+    Returns
+    -------
+    A list with one dict per dimension, mapping each value of that dimension
+    to the list of candidates that share it.
+
+    >>> index = build_value_index([(1, 'a'), (2, 'a'), (2, 'b')], 2)
+    >>> index[0][2]
+    [(2, 'a'), (2, 'b')]
+    >>> index[1]['a']
+    [(1, 'a'), (2, 'a')]
+    """
+    value_index = [{} for _ in range(n_dims)]
+    for cand in candidates:
+        for dim, value in enumerate(cand):
+            value_index[dim].setdefault(value, []).append(cand)
+
+    return value_index
+
+
+class KnowledgeTable(object):
+    """Whether each player would know, for every candidate of a game
+
+    Worked out once for a game, so that statements can be evaluated for any
+    candidate by looking up what each player would know, rather than by
+    working it out with `Player.would_know`.
+
+    A candidate with a value that no candidate of the game has is in an
+    empty group of the author. Facts about the author are false for it, and
+    every other player would know, as `Player.would_know` gives for no
+    truths.
+
+    >>> table = KnowledgeTable([(1, 'a'), (1, 'b'), (2, 'b')], ['0', '1'])
+    >>> table.knows(0, (2, 'b'))
+    <Knows.yes: 1>
+    >>> table.would_know(0, 1, (1, 'a'))
+    <Knows.maybe: 0>
+    >>> table.possible(Statement(author='0', facts={'0': Knows.no,
+    ...                                             '1': Knows.no}))
+    False
+
+    Attributes
+    ----------
+    player_names: tuple of str
+        The names of the players, in the order of the dimensions they are
+        told about.
+    group_sizes: list of dicts
+        For each dimension, a mapping from each value to the number of
+        candidates that share it.
+    n_known: list of lists of dicts
+        `n_known[author][player]` maps each value of the author's dimension
+        to the number of candidates in that group for which the player would
+        know.
+    """
+
+    __slots__ = ('player_names', 'group_sizes', 'n_known', '_plans')
+
+    def __init__(self, candidates, player_names, value_index=None):
+        n_dims = len(player_names)
+        if value_index is None:
+            value_index = build_value_index(candidates, n_dims)
+        if _stats is not None:
+            _stats.candidates_scanned += len(candidates)
+
+        self.player_names = tuple(player_names)
+        self.group_sizes = [{value: len(group)
+                             for value, group in index.items()}
+                            for index in value_index]
+        self.n_known = [[_count_known(value_index, author, player)
+                         for player in range(n_dims)]
+                        for author in range(n_dims)]
+        self._plans = {}
+
+    def group_size(self, player, cand):
+        """Get the number of candidates a player cannot tell apart from one
+
+        Parameters
+        ----------
+        player: int
+            The index of the player.
+        cand: tuple
+            The candidate to be considered as the truth.
+
+        Returns
+        -------
+        int
+        """
+        return self.group_sizes[player].get(cand[player], 0)
+
+    def knows(self, player, cand):
+        """Would a player know if a given candidate were the truth?
+
+        Returns
+        -------
+        Knows.yes or Knows.no
+        """
+        if self.group_sizes[player].get(cand[player]) == 1:
+            return Knows.yes
+        return Knows.no
+
+    def would_know(self, author, player, cand):
+        """Would a player know, as far as an author can tell?
+
+        Knowledge is aggregated with `knows_cases` over the candidates that
+        the author cannot tell apart from the given one, as
+        `Player.would_know` does.
+
+        Parameters
+        ----------
+        author: int
+            The index of the player who is told about the candidate.
+        player: int
+            The index of the player whose knowledge is asked about.
+        cand: tuple
+            The candidate to be considered as the truth.
+
+        Returns
+        -------
+        A Knows enum value
+        """
+        value = cand[author]
+        return _knows_count(self.n_known[author][player].get(value, 0),
+                            self.group_sizes[author].get(value, 0))
+
+    def true_for(self, statement, cand):
+        """Is a statement true for a given candidate?
+
+        Parameters
+        ----------
+        statement: Statement or StatementPlan
+        cand: tuple
+
+        Returns
+        -------
+        bool
+
+        Raises
+        ------
+        InvalidStatementError
+        """
+        plan = self._compile(statement)
+        return self._true_for_value(plan, cand[plan.author])
+
+    def possible(self, statement):
+        """Is a statement true for at least one of the candidates?
+
+        A statement that is true for none of them can never be made in this
+        game.
+
+        Parameters
+        ----------
+        statement: Statement or StatementPlan
+
+        Returns
+        -------
+        bool
+
+        Raises
+        ------
+        InvalidStatementError
+        """
+        plan = self._compile(statement)
+        return any(self._true_for_value(plan, value)
+                   for value in self.group_sizes[plan.author])
+
+    def _compile(self, statement):
+        """Compile a statement once, however often it is asked about"""
+        plan = self._plans.get(statement)
+        if plan is None:
+            if isinstance(statement, Repeat):
+                msg = "Expected a single statement"
+                raise InvalidStatementError(msg)
+
+            plan, = _compile_all([statement], self.player_names)
+            self._plans[statement] = plan
+        return plan
+
+    def _true_for_value(self, plan, value):
+        """Is a statement true for the group of the author with a value?"""
+        author = plan.author
+        n_total = self.group_sizes[author].get(value, 0)
+        if plan.author_expected is not None and (
+                n_total == 0 or
+                (Knows.yes if n_total == 1 else Knows.no) !=
+                plan.author_expected):
+            return False
+
+        n_known = self.n_known[author]
+        for indices, expected in plan.facts:
+            if not any(_knows_count(n_known[idx].get(value, 0), n_total) ==
+                       expected for idx in indices):
+                return False
+
+        return True
+
+
 def _max_widths(candidates):
     """Get the maximum width for each element of a candidate tuple
 
@@ -149,21 +385,46 @@ class Game(object):
 
     Attributes
     ----------
-    candidates: list of tuples
+    candidates: frozenset of tuples
         The candidates that Cheryl gives the players to choose from. These are
         tuples, with each part of the tuple being a dimension that one player
         is told about. As statements are applied to filter out candidates that
-        incompatible with them, this list shrinks to contain only those that
+        incompatible with them, this set shrinks to contain only those that
         are still in play.
+    players: tuple of Player
+        One player for each dimension. Games derived by filtering share the
+        players of the game they were derived from.
     player_names: str
         If given, these are the names of the players. If not given, players are
         named after the index of the dimension they are told about.
+    value_index: list of dicts
+        For each dimension, a mapping from each value to the candidates that
+        share it, so that compatible candidates can be looked up rather than
+        searched for. Built the first time it is needed.
+    knowledge: KnowledgeTable
+        Whether each player would know, for every candidate and every group
+        of candidates an author cannot tell apart. Built the first time it is
+        needed.
+    engine: str
+        The name of the engine used to evaluate statements, one of 'python'
+        (the default), 'bitset' and 'numpy'. All engines give the same
+        results. The 'bitset' engine represents sets of candidates as integer
+        bit masks and is fast for long chains of statements; the 'numpy'
+        engine requires numpy and is faster for large games. Games derived by
+        filtering use the same engine.
     """
 
-    def __init__(self, candidates, player_names=None):
+    __slots__ = ('candidates', 'players', 'engine', '_player_names',
+                 '_value_index', '_knowledge', '_widths', '_layout',
+                 '_sorted', '_parent_sorted')
+
+    # the number of candidates shown by __repr__, see `render` for the rest
+    repr_max_rows = 100
+
+    def __init__(self, candidates, player_names=None, engine='python'):
 
         n_players = len(candidates[0])
-        self.candidates = set(candidates)
+        self.candidates = frozenset(candidates)
 
         if player_names is None:
             player_names = [str(i) for i in range(n_players)]
@@ -179,8 +440,74 @@ class Game(object):
                     )
             raise BadPlayerNamesError(msg)
 
+        if engine not in _ENGINES:
+            msg = "Unknown engine '{}'".format(engine)
+            raise BadEngineError(msg)
+
+        elif engine == 'numpy' and not _import_numpy():
+            msg = "The 'numpy' engine requires numpy to be installed"
+            raise BadEngineError(msg)
+
+        self.players = tuple(Player(n, idx)
+                             for idx, n in enumerate(player_names))
+        self.engine = engine
+        self._player_names = tuple(player_names)
+        self._value_index = None
+        self._knowledge = None
+        self._widths = None
+        self._layout = None
+        self._sorted = None
+        self._parent_sorted = None
+
+    def _derive(self, candidates):
+        """Make a game with other candidates but the same players and engine
+
+        Skips the checks done by the constructor, so the candidates must have
+        as many dimensions as this game has players.
+        """
+        game = Game.__new__(Game)
+        game.candidates = frozenset(candidates)
+        game.players = self.players
+        game.engine = self.engine
+        game._player_names = self._player_names
+        game._value_index = None
+        game._knowledge = None
+        game._widths = None
+        game._layout = None
+        game._sorted = None
+        game._parent_sorted = None
+        return game
+
+    def _derive_subset(self, candidates):
+        """Make a game with some of the candidates of this game
+
+        The new game is laid out like this one when shown, whether or not
+        this one has been shown yet, and sorts its candidates for display by
+        picking them from this game's sorted candidates.
+        """
+        game = self._derive(candidates)
+        game._widths = self._widths
+        game._layout = self._layout or self.candidates
+        if self._sorted is not None:
+            game._parent_sorted = self._sorted
+        else:
+            game._parent_sorted = self._parent_sorted
+        return game
 
-        self.players = [Player(n, idx) for idx, n in enumerate(player_names)]
+    @property
+    def value_index(self):
+        if self._value_index is None:
+            self._value_index = build_value_index(self.candidates,
+                                                  len(self.players))
+        return self._value_index
+
+    @property
+    def knowledge(self):
+        if self._knowledge is None:
+            self._knowledge = KnowledgeTable(self.candidates,
+                                             self._player_names,
+                                             value_index=self.value_index)
+        return self._knowledge
 
     def get_player(self, name):
         """Get a Player instance by name"""
@@ -190,7 +517,26 @@ class Game(object):
 
     def get_player_names(self):
         """Get the names of the players"""
-        return [player.name for player in self.players]
+        return list(self._player_names)
+
+    def compile(self, statements):
+        """Compile Statements against the players of this game
+
+        Parameters
+        ----------
+        statements: list of Statement, StatementPlan or Repeat
+            The statements to compile. Plans that were already compiled for
+            the same player names are used as they are.
+
+        Returns
+        -------
+        A list of StatementPlan, and of Repeat with compiled statements
+
+        Raises
+        ------
+        InvalidStatementError
+        """
+        return _compile_all(statements, self._player_names)
 
     def filter(self, statement):
         """Filter the candidates based on a Statment about player's knowledge
@@ -199,7 +545,7 @@ class Game(object):
 
         Parameters
         ----------
-        statement: Statement
+        statement: Statement, StatementPlan or Repeat
             The statement to filter the candidates by.
 
         Returns
@@ -212,17 +558,13 @@ class Game(object):
         NoSolutionError
         """
 
-        filtered = []
-        for cand in self.candidates:
-            if statement.true_for(cand=cand, game=self):
-                filtered.append(cand)
-
-        if not filtered:
-            msg = "No candidates found that satisfy the filtering criterion"
-            raise NoSolutionError(msg)
-
-        return Game(candidates=filtered, player_names=self.get_player_names())
+        plan, = self.compile([statement])
+        if _filter_cache is not None:
+            return _filter_cached(self, plan, _filter_cache)
 
+        engine = _ENGINES[self.engine]
+        state = _apply_plan(engine, engine.start(self), plan)
+        return engine.to_game(state)
 
     def filter_chain(self, statements, trace=False):
         """Filter the candidates based on a list of Statments
@@ -231,7 +573,7 @@ class Game(object):
 
         Parameters
         ----------
-        statements: list of Statement
+        statements: list of Statement, StatementPlan or Repeat
             The statements to filter the candidates by, applied one after
             another.
         trace: bool
@@ -251,21 +593,82 @@ class Game(object):
             print("Before filtering:")
             print(repr(self))
 
-        game = self
-        for i, statement in enumerate(statements, 1):
-            game = game.filter(statement)
+        plans = self.compile(statements)
+        cache = _filter_cache
+        if cache is not None:
+            game = self
+            for i, plan in enumerate(plans, 1):
+                game = _filter_cached(game, plan, cache)
+                if trace:
+                    print("\nAfter applying statement {}:".format(i))
+                    print(repr(game))
+
+            return game
+
+        engine = _ENGINES[self.engine]
+        state = engine.start(self)
+        for i, plan in enumerate(plans, 1):
+            state = _apply_plan(engine, state, plan)
             if trace:
                 print("\nAfter applying statement {}:".format(i))
-                print(repr(game))
+                print(repr(engine.to_game(state)))
 
-        return game
+        return engine.to_game(state)
+
+    def trace_chain(self, statements):
+        """Apply a list of Statements, recording what each one rules out
+
+        Rather than a copy of the game after each statement, as printed by
+        `filter_chain` with `trace=True`, only the candidates that each
+        statement rules out are kept, with the fact that was false for them.
+        Any of the games along the way can be rebuilt from the trace. If a
+        statement rules out all candidates that are left, the trace stops
+        there instead of raising a NoSolutionError.
+
+        The trace is worked out with the python engine, whatever the engine
+        of the game, as it checks the facts for each group of candidates of
+        the author in turn.
+
+        >>> game = Game([(1, 2), (1, 3), (2, 3)])
+        >>> trace = game.trace_chain([Statement(author='0', facts={
+        ...     '0': Knows.no, '1': Knows.maybe})])
+        >>> trace.steps[0].removed
+        {'0': [(2, 3)]}
+        >>> sorted(trace.replay().candidates)
+        [(1, 2), (1, 3)]
+
+        Parameters
+        ----------
+        statements: list of Statement, StatementPlan or Repeat
+            The statements to filter the candidates by, applied one after
+            another.
+
+        Returns
+        -------
+        ChainTrace
+
+        Raises
+        ------
+        InvalidStatementError
+        """
+        plans = self.compile(statements)
+        trace = ChainTrace(self, [], None)
+
+        engine = _ENGINES['python']
+        state = engine.start(self)
+        for plan in plans:
+            if not _trace_plan(engine, state, plan, trace.steps):
+                trace.error = NoSolutionError
+                break
+
+        return trace
 
     def n_solutions(self, statements):
         """How many candidates are compatible with a list of Statements?
 
         Parameters
         ----------
-        statements: list of Statement
+        statements: list of Statement, StatementPlan or Repeat
             The statements to filter the candidates by, applied one after
             another.
 
@@ -290,7 +693,7 @@ class Game(object):
 
         Parameters
         ----------
-        statements: list of Statement
+        statements: list of Statement, StatementPlan or Repeat
             The statements to filter the candidates by, applied one after
             another.
         trace: bool
@@ -312,14 +715,146 @@ class Game(object):
 
         return list(game.candidates)[0]
 
+    def evaluate_chains(self, chains):
+        """Apply many lists of Statements, filtering shared prefixes once
 
-    def __repr__(self):
+        The lists are put in a trie, so that a statement is applied once for
+        each distinct prefix it ends rather than once for each list. Lists
+        share a prefix if they start with the same Statement objects.
 
-        views = []
-        for player in self.players:
-            views.append(player.view(self.candidates))
+        >>> game = Game([(1, 2), (1, 3), (2, 3)])
+        >>> zero_no = Statement(author='0', facts={'0': Knows.no})
+        >>> one_no = Statement(author='1', facts={'1': Knows.no})
+        >>> one_yes = Statement(author='1', facts={'1': Knows.yes})
+        >>> for result in game.evaluate_chains([[zero_no], [zero_no, one_no],
+        ...                                     [one_yes]]):
+        ...     print(result)
+        ChainResult(n_solutions=2, solution=None, error=MultipleSolutionsError)
+        ChainResult(n_solutions=0, solution=None, error=NoSolutionError)
+        ChainResult(n_solutions=1, solution=(1, 2), error=None)
+
+        Parameters
+        ----------
+        chains: list of lists of Statement, StatementPlan or Repeat
+            The lists of statements to filter the candidates by.
+
+        Returns
+        -------
+        A list with a ChainResult for each list of statements, in order.
+
+        Raises
+        ------
+        InvalidStatementError
+        """
+        chains = [list(chain) for chain in chains]
+
+        statements = list({statement: None for chain in chains
+                           for statement in chain})
+        plans = dict(zip(statements, self.compile(statements)))
+
+        # each node is a pair of a dict of children and the chains that end
+        # at the node
+        root = ({}, [])
+        for i, chain in enumerate(chains):
+            node = root
+            for statement in chain:
+                node = node[0].setdefault(statement, ({}, []))
+            node[1].append(i)
+
+        results = [None] * len(chains)
+        engine = _ENGINES[self.engine]
+        stack = [(root, engine.start(self))]
+        while stack:
+            (children, ending), state = stack.pop()
+            if ending:
+                result = ChainResult.from_state(engine, state)
+                for i in ending:
+                    results[i] = result
+
+            children = list(children.items())
+            for n, (statement, child) in enumerate(children, 1):
+                # the last child can have the state, the others get copies
+                if n == len(children):
+                    child_state = state
+                else:
+                    child_state = engine.copy(state)
+                try:
+                    child_state = _apply_plan(engine, child_state,
+                                              plans[statement])
+                except NoSolutionError:
+                    result = ChainResult(0, None, NoSolutionError)
+                    for i in _trie_chains(child):
+                        results[i] = result
+                    continue
+                stack.append((child, child_state))
+
+        return results
+
+    def signature(self):
+        """Get a signature that is shared by games with the same structure
+
+        Two games have the same structure if one can be turned into the other
+        by renaming values within a dimension. Such games have the same
+        solutions under any Statements, up to the renaming. Games with equal
+        signatures always have the same structure. Games with the same
+        structure get equal signatures unless they are highly symmetric, in
+        which case they may not.
+
+        Returns
+        -------
+        A sorted tuple of candidates, with the values in each dimension
+        replaced by integers.
+        """
+        return _canonical_signature(list(self.candidates), len(self.players))
+
+    def to_dict(self):
+        """Get the candidates and player names as a dict that JSON can encode
+
+        Candidates are sorted, so equal games give equal dicts.
+
+        >>> Game([(2, 'b'), (1, 'a')]).to_dict()
+        {'candidates': [[1, 'a'], [2, 'b']], 'player_names': ['0', '1']}
+        """
+        return {'candidates': [list(cand) for cand in sorted(self.candidates)],
+                'player_names': self.get_player_names()}
+
+    @classmethod
+    def from_dict(cls, data, engine='python'):
+        """Make a Game from a dict made by `to_dict`
+
+        Raises
+        ------
+        BadPlayerNamesError, BadEngineError
+        """
+        return cls([tuple(cand) for cand in data['candidates']],
+                   player_names=data.get('player_names'), engine=engine)
+
+    def render(self, start=0, stop=None):
+        """Show the candidates from each player's perspective, as a table
+
+        There is a column for each player, with the candidates sorted by the
+        dimension the player is told about. Column widths and the sorting are
+        worked out once per game, and games derived by filtering reuse them,
+        so only the rows that are shown are formatted.
+
+        >>> game = Game([(1, 'b'), (2, 'a'), (10, 'c')])
+        >>> game.render(stop=2).splitlines()[1:]
+        ['1  b\\t2  a', '2  a\\t1  b']
+
+        Parameters
+        ----------
+        start: int
+            The first row to show.
+        stop: int
+            The row to stop before. If not given, the rows up to the end.
+
+        Returns
+        -------
+        str
+        """
+        widths = self._get_widths()
+        width = sum(widths) + len(widths) - 1
 
-        width = len(views[0][0])
         col_names = []
         for player in self.players:
             col_name = '{0:^{1}}'.format(player.name, width)
@@ -327,11 +862,58 @@ class Game(object):
 
         header = '\t'.join(col_names)
 
-        transposed = list(zip(*views))
-        lines = map(lambda x: '\t'.join(x), transposed)
-        body = '\n'.join(lines)
+        columns = self._sorted_columns(start, stop)
+        lines = ['\t'.join(_format_candidate(cand, widths) for cand in row)
+                 for row in zip(*columns)]
+
+        return '\n'.join([header] + lines)
 
-        return '\n'.join([header, body])
+    def _get_widths(self):
+        # derived games are laid out like the game they were derived from
+        if self._widths is None:
+            self._widths = _max_widths(self._layout or self.candidates)
+        return self._widths
+
+    def _sorted_columns(self, start, stop):
+        """Get rows start to stop of the candidates sorted by each dimension
+
+        A derived game that has not been sorted yet picks the rows from its
+        parent's sorted candidates, and stops once it has enough of them.
+        """
+        if self._sorted is None and self._parent_sorted is not None and \
+                stop is not None:
+            candidates = self.candidates
+            return [list(islice((cand for cand in column if cand in candidates),
+                                start, stop))
+                    for column in self._parent_sorted]
+
+        return [column[start:stop] for column in self._get_sorted()]
+
+    def _get_sorted(self):
+        """Get the candidates sorted by the value of each dimension"""
+        if self._sorted is None:
+            if self._parent_sorted is not None:
+                candidates = self.candidates
+                self._sorted = [[cand for cand in column if cand in candidates]
+                                for column in self._parent_sorted]
+                self._parent_sorted = None
+            else:
+                # sorting is stable, so ties stay in the order of the
+                # candidates themselves
+                ordered = sorted(self.candidates)
+                self._sorted = [sorted(ordered, key=itemgetter(idx))
+                                for idx in range(len(self.players))]
+        return self._sorted
+
+    def __repr__(self):
+        n_rows = len(self.candidates)
+        if n_rows <= self.repr_max_rows:
+            return self.render()
+
+        return '{table}\n... and {n} more candidates'.format(
+                table=self.render(stop=self.repr_max_rows),
+                n=n_rows - self.repr_max_rows
+                )
 
 
 class Statement(object):
@@ -349,6 +931,8 @@ class Statement(object):
         to at least one of the players specified in the tuple.
     """
 
+    __slots__ = ('author', 'facts')
+
     def __init__(self, author, facts):
         for who, condition in facts.items():
 
@@ -378,48 +962,66 @@ class Statement(object):
         bool
         """
 
-        author  = game.get_player(self.author)
-        author_compatible = author.get_compatible(truth=cand, 
-                                                  candidates=game.candidates)
+        if _stats is not None:
+            _stats.true_for_calls += 1
 
-        if (author.name in self.facts and
-            knows(author_compatible) != self.facts[author.name]):
-            return False
+        return game.knowledge.true_for(self, cand)
 
-        for who, expected in self.facts.items():
+    def compile(self, player_names):
+        """Compile the statement against the names of a game's players
 
-            # already dealt with condition on author
-            if who == author:
-                continue
+        Parameters
+        ----------
+        player_names: list of str
+            The names of the players, in the order of the dimensions they are
+            told about.
 
-            # in the case of multiple players, the statement has to be true for
-            # at least one of them
-            if isinstance(who, tuple):
+        Returns
+        -------
+        StatementPlan
 
-                found_match = False
-                for name in who:
+        Raises
+        ------
+        InvalidStatementError
+        """
+        return StatementPlan(self, player_names)
 
-                    player_knowledge = game.get_player(name).would_know(
-                            truths=author_compatible,
-                            candidates=game.candidates
-                            )
-                    if player_knowledge == expected:
-                        found_match = True
+    def to_dict(self):
+        """Get the statement as a dict that JSON can encode
 
-                if not found_match:
-                    return False
+        Facts become a list of pairs of who, as a name or a list of names,
+        and the name of a Knows value.
 
-            else:
+        >>> Statement(author='0', facts={'0': Knows.no}).to_dict()
+        {'author': '0', 'facts': [['0', 'no']]}
+        """
+        facts = []
+        for who, expected in self.facts.items():
+            if isinstance(who, tuple):
+                who = list(who)
+            facts.append([who, expected.name])
 
-                player = game.get_player(who)
-                player_knowledge = player.would_know(
-                        truths=author_compatible,
-                        candidates=game.candidates
-                        )
-                if player_knowledge != self.facts[who]:
-                    return False
+        return {'author': self.author, 'facts': facts}
 
-        return True
+    @classmethod
+    def from_dict(cls, data):
+        """Make a Statement from a dict made by `to_dict`
+
+        Raises
+        ------
+        InvalidStatementError
+        """
+        facts = {}
+        for who, expected in data['facts']:
+            if isinstance(who, list):
+                who = tuple(who)
+            try:
+                facts[who] = Knows[expected]
+            except KeyError:
+                msg = "Unknown knowledge '{}'".format(expected)
+                raise InvalidStatementError(msg)
+
+        return cls(author=data['author'], facts=facts)
 
     def __repr__(self):
         return 'Statement(author={author}, facts={facts}'.format(
@@ -428,89 +1030,1639 @@ class Statement(object):
                 )
 
 
-def choose_k(k):
-    """Get a function that samples K values from a list of choices
+class StatementPlan(object):
+    """A Statement compiled against the names of a game's players
 
-    Would be nice to use numpy.random.choice here, but will avoid adding numpy
-    as a dependency.
+    Names are resolved to the index of the dimension each player is told
+    about, and facts are put in an order that is cheap to check: the author's
+    own knowledge first, then facts about single players, then facts about
+    tuples of players. A plan can be reused for every game with the same
+    player names.
 
-    Parameters
+    Attributes
     ----------
-    k: int
-        The number of candidates to choose.
-
-    Returns
-    -------
-    Function
+    statement: Statement
+        The statement the plan was compiled from.
+    player_names: tuple of str
+        The names of the players the plan was compiled for.
+    author: int
+        The index of the author.
+    author_expected: Knows
+        What the statement says about the author's knowledge, or None if it
+        says nothing.
+    facts: list of (tuple of int, Knows)
+        The facts about the other players, as the indices of the players
+        and the knowledge at least one of them must have.
+    fact_keys: list of str or tuple of str
+        The keys of `statement.facts` that each of `facts` was made from.
     """
 
-    def choose_func(choices):
-        return [random.choice(choices) for _ in range(k)]
+    __slots__ = ('statement', 'player_names', 'author', 'author_expected',
+                 'facts', 'fact_keys')
 
-    return choose_func
+    def __init__(self, statement, player_names):
+        player_index = {name: idx for idx, name in enumerate(player_names)}
 
+        def get_index(name):
+            if name not in player_index:
+                msg = "Unknown player '{}'".format(name)
+                raise InvalidStatementError(msg)
+            return player_index[name]
 
-def sample_candidates(domains, n_candidates, max_tries=100):
-    """Sample N unique candidates from given sets of choices
+        self.statement = statement
+        self.player_names = tuple(player_names)
+        self.author = get_index(statement.author)
+        self.author_expected = statement.facts.get(statement.author)
 
-    Parameters
-    ----------
-    domains: list of lists
-        Each sublist contains the possible values that the corresponding
-        dimension can take on.
-    n_candidates: int
-        The number of unique candidates to sample from each domain.
-    max_tries: int
-        The maximum number of times to loop in order to get n_candidates unique
-        candidate, to prevent an infinite loop in cases that cannot be
-        satisfied.
+        single, multiple = [], []
+        for who, expected in statement.facts.items():
+            if who == statement.author:
+                continue
+            elif isinstance(who, tuple):
+                multiple.append((who, (tuple(map(get_index, who)), expected)))
+            else:
+                single.append((who, ((get_index(who),), expected)))
 
-    Returns
-    -------
-    A sorted list of tuples
+        self.fact_keys = [who for who, _ in single + multiple]
+        self.facts = [fact for _, fact in single + multiple]
 
-    >>> random.seed(123)
-    >>> domains = [range(10), range(10, 20), range(20, 30)]
-    >>> sample_candidates(domains, 5)
-    [(0, 11, 25), (1, 16, 20), (4, 10, 25), (4, 18, 22), (6, 18, 22)]
-    >>> domains = [list('abcdef'), range(6)]
-    >>> sample_candidates(domains, 3)
-    [('c', 1), ('c', 5), ('e', 1)]
-    >>> domains = [[0, 1], ['a', 'b']]
-    >>> sample_candidates(domains, 4)
-    [(0, 'a'), (0, 'b'), (1, 'a'), (1, 'b')]
+    def __repr__(self):
+        return 'StatementPlan(statement={stmt}, player_names={names})'.format(
+                stmt=repr(self.statement),
+                names=repr(self.player_names)
+                )
+
+
+class Repeat(object):
+    """Statements that are made again, round after round
+
+    A Repeat can be used wherever a list of statements is applied to a game.
+    Its statements are applied one after another, as one round, for up to
+    `max_rounds` rounds. As soon as a round rules out no candidates the
+    candidates in play can no longer change, so the remaining rounds are
+    skipped. Without `until` this is the same as spelling out all rounds.
+
+    >>> game = Game([(1, 3), (1, 4), (2, 3), (2, 4), (3, 5)])
+    >>> nobody_knows = Repeat([Statement(author='0', facts={'0': Knows.no}),
+    ...                        Statement(author='1', facts={'1': Knows.no})],
+    ...                       max_rounds=1000)
+    >>> sorted(game.filter_chain([nobody_knows]).candidates)
+    [(1, 3), (1, 4), (2, 3), (2, 4)]
+
+    Attributes
+    ----------
+    statements: list of Statement or StatementPlan
+        The statements that make up one round.
+    max_rounds: int
+        The largest number of rounds to apply.
+    until: Statement or StatementPlan
+        If given, no further rounds are started once this statement is true
+        for at least one of the candidates in play, for example once some
+        player would know. It is checked before each round, and is not
+        applied itself.
     """
 
-    sample = []
-    n_unique = 0
-    n_tries = 0
-    while n_unique != n_candidates:
+    __slots__ = ('statements', 'max_rounds', 'until')
 
-        n_tries += 1
-        if n_tries > max_tries:
-            raise TooManyTriesError()
+    def __init__(self, statements, max_rounds, until=None):
+        if not statements:
+            msg = "Repeat needs at least one statement"
+            raise InvalidStatementError(msg)
 
-        choose = choose_k(n_candidates - n_unique)
+        if isinstance(until, Repeat):
+            msg = "until must be a single statement"
+            raise InvalidStatementError(msg)
 
-        candidates = map(choose, domains)
-        sample.extend(list(zip(*candidates)))
+        self.statements = list(statements)
+        self.max_rounds = max_rounds
+        self.until = until
 
-        n_unique = len(set(sample))
+    def compile(self, player_names):
+        """Compile the statements against the names of a game's players
 
-    return sorted(list(set(sample)))
+        Returns
+        -------
+        Repeat
+            A Repeat of StatementPlans.
 
+        Raises
+        ------
+        InvalidStatementError
+        """
+        player_names = tuple(player_names)
+        until = self.until
+        if until is not None:
+            until, = _compile_all([until], player_names)
 
-def find_game(domains, n_candidates, statements, n_tries, player_names=None, 
-              seed=123):
-    """Find a game that satisfies a given list of Statements
+        return Repeat(_compile_all(self.statements, player_names),
+                      self.max_rounds, until=until)
 
-    Find a Game object that has a unique solution under the given Statements.
-    Raises NoGameFoundError if no such game is found.
+    def to_dict(self):
+        """Get the Repeat as a dict that JSON can encode"""
+        until = self.until
+        if until is not None:
+            until = until.to_dict()
 
-    Parameters
-    ----------
-    domains: list of lists
-        Each sublist contains the possible values that the corresponding
+        return {'repeat': [statement.to_dict()
+                           for statement in self.statements],
+                'max_rounds': self.max_rounds,
+                'until': until}
+
+    @classmethod
+    def from_dict(cls, data):
+        """Make a Repeat from a dict made by `to_dict`
+
+        Raises
+        ------
+        InvalidStatementError
+        """
+        until = data.get('until')
+        if until is not None:
+            until = Statement.from_dict(until)
+
+        return cls([statement_from_dict(statement)
+                    for statement in data['repeat']],
+                   data['max_rounds'], until=until)
+
+    def __repr__(self):
+        return 'Repeat(statements={stmts}, max_rounds={rounds}, ' \
+               'until={until})'.format(
+                stmts=repr(self.statements),
+                rounds=self.max_rounds,
+                until=repr(self.until)
+                )
+
+
+def statement_from_dict(data):
+    """Make a Statement or Repeat from a dict made by its `to_dict`
+
+    >>> statement_from_dict({'author': '0', 'facts': [['0', 'yes']]})
+    Statement(author=0, facts={'0': <Knows.yes: 1>}
+
+    Raises
+    ------
+    InvalidStatementError
+    """
+    if 'repeat' in data:
+        return Repeat.from_dict(data)
+    return Statement.from_dict(data)
+
+
+def multiplicity_from_dict(data):
+    """Make a multiplicity dict from one that was decoded from JSON
+
+    JSON turns the keys of a multiplicity dict into strings and the bounds
+    into lists. Anything that is not a dict, like 'auto', is returned as it is.
+
+    >>> multiplicity_from_dict({'1': [2, 3]})
+    {1: (2, 3)}
+    >>> multiplicity_from_dict('auto')
+    'auto'
+    """
+    if not isinstance(data, dict):
+        return data
+
+    return {int(dim): tuple(bounds) for dim, bounds in data.items()}
+
+
+def error_to_dict(e):
+    """Describe an exception as a dict that JSON can encode
+
+    >>> error_to_dict(NoGameFoundError('Counter()'))
+    {'type': 'NoGameFoundError', 'message': 'Counter()'}
+    """
+    return {'type': type(e).__name__, 'message': str(e)}
+
+
+def _compile_all(statements, player_names):
+    """Compile a list of statements, see `Game.compile`"""
+
+    plans = []
+    for statement in statements:
+        if not isinstance(statement, StatementPlan):
+            statement = statement.compile(player_names)
+        elif statement.player_names != player_names:
+            msg = "Plan was compiled for players {}".format(
+                    statement.player_names)
+            raise InvalidStatementError(msg)
+        plans.append(statement)
+
+    return plans
+
+
+class ChainResult(object):
+    """The outcome of applying one list of Statements to a game
+
+    Attributes
+    ----------
+    n_solutions: int
+        The number of candidates that are compatible with the statements.
+    solution: tuple
+        The solution if there is exactly one, otherwise None.
+    error: type
+        The exception that `Game.get_solution` would raise, NoSolutionError
+        or MultipleSolutionsError, or None if there is a unique solution.
+    """
+
+    __slots__ = ('n_solutions', 'solution', 'error')
+
+    def __init__(self, n_solutions, solution, error):
+        self.n_solutions = n_solutions
+        self.solution = solution
+        self.error = error
+
+    @classmethod
+    def from_state(cls, engine, state):
+        """Get the result for the candidates in play in an engine state"""
+        n_solutions = engine.n_alive(state)
+        if n_solutions > 1:
+            return cls(n_solutions, None, MultipleSolutionsError)
+
+        solution, = engine.to_game(state).candidates
+        return cls(n_solutions, solution, None)
+
+    def to_dict(self):
+        """Get the result as a dict that JSON can encode
+
+        >>> ChainResult(0, None, NoSolutionError).to_dict()
+        {'n_solutions': 0, 'solution': None, 'error': 'NoSolutionError'}
+        """
+        error = self.error
+        if error is not None:
+            error = error.__name__
+
+        solution = self.solution
+        if solution is not None:
+            solution = list(solution)
+
+        return {'n_solutions': self.n_solutions, 'solution': solution,
+                'error': error}
+
+    def __repr__(self):
+        return 'ChainResult(n_solutions={n}, solution={solution}, ' \
+               'error={error})'.format(
+                n=self.n_solutions,
+                solution=repr(self.solution),
+                error=None if self.error is None else self.error.__name__
+                )
+
+
+def _trie_chains(node):
+    """Get the chains that end at a node of a trie or below it"""
+    chains = []
+    stack = [node]
+    while stack:
+        children, ending = stack.pop()
+        chains.extend(ending)
+        stack.extend(children.values())
+    return chains
+
+
+class TraceStep(object):
+    """The candidates that one Statement ruled out, and why
+
+    Attributes
+    ----------
+    statement: Statement
+        The statement that was applied.
+    n_before: int
+        The number of candidates in play before the statement.
+    removed: dict
+        Maps each fact that was false for some of the candidates, as a key of
+        `statement.facts`, to the candidates it was false for. The author's
+        own knowledge is checked first, then the facts about single players,
+        then those about tuples of players, and candidates are listed under
+        the first fact that was false for them.
+    """
+
+    __slots__ = ('statement', 'n_before', 'removed')
+
+    def __init__(self, statement, n_before, removed):
+        self.statement = statement
+        self.n_before = n_before
+        self.removed = removed
+
+    @property
+    def n_removed(self):
+        """The number of candidates the statement ruled out"""
+        return sum(len(cands) for cands in self.removed.values())
+
+    @property
+    def n_after(self):
+        """The number of candidates in play after the statement"""
+        return self.n_before - self.n_removed
+
+    def __repr__(self):
+        return 'TraceStep(statement={stmt}, n_before={n}, removed={removed})' \
+                .format(stmt=repr(self.statement), n=self.n_before,
+                        removed=repr(self.removed))
+
+
+class ChainTrace(object):
+    """What each of a list of Statements ruled out, made by `trace_chain`
+
+    Attributes
+    ----------
+    game: Game
+        The game the statements were applied to.
+    steps: list of TraceStep
+        A step for each statement that was applied, in order. The statements
+        of a Repeat get a step for each round that was applied.
+    error: type
+        NoSolutionError if the last step ruled out all candidates that were
+        left, otherwise None.
+    """
+
+    __slots__ = ('game', 'steps', 'error')
+
+    def __init__(self, game, steps, error):
+        self.game = game
+        self.steps = steps
+        self.error = error
+
+    def __len__(self):
+        return len(self.steps)
+
+    def replay(self, n_steps=None):
+        """Rebuild the game after a number of steps
+
+        Parameters
+        ----------
+        n_steps: int
+            The number of steps to apply. If not given, all of them.
+
+        Returns
+        -------
+        Game
+
+        Raises
+        ------
+        NoSolutionError
+        """
+        alive = set(self.game.candidates)
+        for step in self.steps[:n_steps]:
+            for cands in step.removed.values():
+                alive.difference_update(cands)
+
+        if not alive:
+            msg = "No candidates found that satisfy the filtering criterion"
+            raise NoSolutionError(msg)
+        elif len(alive) == len(self.game.candidates):
+            return self.game
+
+        return self.game._derive_subset(alive)
+
+    def __repr__(self):
+        return 'ChainTrace(n_steps={n}, n_removed={removed}, error={error})' \
+                .format(n=len(self.steps),
+                        removed=sum(step.n_removed for step in self.steps),
+                        error=None if self.error is None
+                        else self.error.__name__)
+
+
+def _trace_plan(engine, state, plan, steps):
+    """Apply a StatementPlan or Repeat with the python engine, tracing it
+
+    A TraceStep is added to `steps` for each statement that is applied.
+
+    Returns
+    -------
+    False if no candidates are left, otherwise True
+    """
+    if isinstance(plan, Repeat):
+        for _ in range(plan.max_rounds):
+            if (plan.until is not None and
+                engine.satisfiable(state, plan.until)):
+                break
+
+            n_before = len(state.alive)
+            for round_plan in plan.statements:
+                if not _trace_plan(engine, state, round_plan, steps):
+                    return False
+
+            if len(state.alive) == n_before:
+                break
+
+        return True
+
+    failed = []
+    removed = engine._removed(state, plan, failed)
+
+    # the groups are updated in place as candidates are removed, so they are
+    # copied first
+    by_fact = {}
+    for fact, group in failed:
+        key = plan.statement.author if fact is None else plan.fact_keys[fact]
+        by_fact.setdefault(key, []).extend(group)
+    steps.append(TraceStep(plan.statement, len(state.alive), by_fact))
+
+    if len(removed) == len(state.alive):
+        return False
+    elif removed:
+        state.remove(removed)
+
+    return True
+
+
+class _PythonState(object):
+    """The state of a Game as seen by the python engine
+
+    Attributes
+    ----------
+    game: Game
+        The game that the state was started from.
+    alive: set of tuples
+        The candidates that are still in play.
+    groups: list of dicts
+        For each dimension, a mapping from each value to the set of candidates
+        in play that share it.
+    n_known: dict
+        Maps a pair of dimensions (author, player) to a dict that gives, for
+        each value of the author's dimension, the number of candidates in that
+        group for which the player would know. Pairs are added the first time
+        a statement needs them and are kept up to date from then on.
+    """
+
+    __slots__ = ('game', 'alive', 'groups', 'n_known')
+
+    def __init__(self, game, alive, groups, n_known):
+        self.game = game
+        self.alive = alive
+        self.groups = groups
+        self.n_known = n_known
+
+    def get_n_known(self, author, player):
+        """Get the number of known candidates per group of the author"""
+        pair = (author, player)
+        if pair not in self.n_known:
+            self.n_known[pair] = _count_known(self.groups, author, player)
+
+        return self.n_known[pair]
+
+    def remove(self, removed):
+        """Remove candidates from play, updating only the groups they touch
+
+        Parameters
+        ----------
+        removed: list of tuples
+            The candidates to remove.
+        """
+
+        # whether a player knows can only change for candidates that share a
+        # group with a removed candidate
+        touched = set()
+        for cand in removed:
+            for idx, value in enumerate(cand):
+                touched.add((idx, value))
+
+        self._count_known(touched, -1)
+
+        self.alive.difference_update(removed)
+        for cand in removed:
+            for idx, value in enumerate(cand):
+                group = self.groups[idx][value]
+                group.discard(cand)
+                if not group:
+                    del self.groups[idx][value]
+
+        self._count_known(touched, 1)
+
+    def _count_known(self, touched, sign):
+        """Add or remove the known candidates in the given groups"""
+        for (author, player), counts in self.n_known.items():
+            player_groups = self.groups[player]
+            for idx, value in touched:
+                if idx != player or value not in player_groups:
+                    continue
+
+                group = player_groups[value]
+                if len(group) == 1:
+                    for cand in group:
+                        counts[cand[author]] = counts.get(cand[author], 0) + sign
+
+
+def _count_known(groups, author, player):
+    """Count the candidates in each group of an author that a player knows
+
+    Parameters
+    ----------
+    groups: list of dicts
+        For each dimension, a mapping from each value to the candidates that
+        share it, like a value index.
+    author: int
+    player: int
+
+    Returns
+    -------
+    A dict mapping each value of the author's dimension to the number of
+    candidates with that value for which the player would know.
+    """
+    player_groups = groups[player]
+    return {value: sum(1 for cand in group
+                       if len(player_groups[cand[player]]) == 1)
+            for value, group in groups[author].items()}
+
+
+class _PythonEngine(object):
+    """Evaluates statements one group of candidates at a time
+
+    Engines turn a Game into an engine specific state with `start`, filter
+    that state by a Statement with `apply`, and turn it back into a Game with
+    `to_game`. `apply` raises a NoSolutionError if no candidates are left.
+    Engines may update the state passed to `apply` in place, so it must not
+    be used afterwards; `copy` gives a state that can be filtered separately.
+
+    This engine keeps track of the size of each group of candidates, and of
+    how many candidates in each group of an author a player would know for.
+    After each statement only the groups touched by the removed candidates
+    are updated.
+    """
+
+    def start(self, game):
+        groups = [{value: set(group) for value, group in index.items()}
+                  for index in game.value_index]
+        return _PythonState(game, set(game.candidates), groups, {})
+
+    def copy(self, state):
+        groups = [{value: set(group) for value, group in player_groups.items()}
+                  for player_groups in state.groups]
+        n_known = {pair: dict(counts)
+                   for pair, counts in state.n_known.items()}
+        return _PythonState(state.game, set(state.alive), groups, n_known)
+
+    def apply(self, state, plan):
+        removed = self._removed(state, plan)
+        if len(removed) == len(state.alive):
+            msg = "No candidates found that satisfy the filtering criterion"
+            raise NoSolutionError(msg)
+
+        if removed:
+            state.remove(removed)
+
+        return state
+
+    def satisfiable(self, state, plan):
+        return len(self._removed(state, plan)) < len(state.alive)
+
+    def _removed(self, state, plan, failed=None):
+        """Get the candidates in play that a statement is false for
+
+        If a list `failed` is given, a pair of the fact that was false and
+        the group of candidates it was false for is added to it for each
+        group that is removed. The fact is None for the author's own
+        knowledge, and the index of an entry of `plan.facts` otherwise.
+        """
+        author = plan.author
+
+        def would_know(idx, value, n_total):
+            if _stats is not None:
+                _stats.would_know_calls += 1
+            n_known = state.get_n_known(author, idx)
+            return _knows_count(n_known.get(value, 0), n_total)
+
+        # all candidates that share the author's value are indistinguishable
+        # to the author, so the statement is either true for all of them or
+        # for none of them
+        removed = []
+        for value, group in state.groups[author].items():
+            n_total = len(group)
+            if (plan.author_expected is not None and
+                knows(group) != plan.author_expected):
+                removed.extend(group)
+                if failed is not None:
+                    failed.append((None, group))
+                continue
+
+            for fact, (indices, expected) in enumerate(plan.facts):
+                if not any(would_know(idx, value, n_total) == expected
+                           for idx in indices):
+                    removed.extend(group)
+                    if failed is not None:
+                        failed.append((fact, group))
+                    break
+
+        return removed
+
+    def n_alive(self, state):
+        return len(state.alive)
+
+    def to_game(self, state):
+        if len(state.alive) == len(state.game.candidates):
+            return state.game
+
+        return state.game._derive_subset(state.alive)
+
+
+def _knows_count(n_known, n_total):
+    """Aggregate knowledge over cases from the number of known cases
+
+    Equivalent to `knows_cases` for a list of `n_total` cases, `n_known` of
+    which are Knows.yes and the rest Knows.no.
+
+    >>> _knows_count(2, 2)
+    <Knows.yes: 1>
+    >>> _knows_count(1, 2)
+    <Knows.maybe: 0>
+    """
+    if n_known == n_total:
+        return Knows.yes
+    elif n_known == 0:
+        return Knows.no
+    else:
+        return Knows.maybe
+
+
+class _BitsetState(object):
+    """The state of a Game as seen by the bitset engine
+
+    Attributes
+    ----------
+    game: Game
+        The game that the state was started from.
+    candidates: list of tuples
+        The candidates of that game, in a fixed order. Candidate i is
+        represented by bit i.
+    groups: list of lists of ints
+        For each dimension, the bit masks of the groups of candidates that
+        share a value.
+    alive: int
+        The bit mask of the candidates that are still in play.
+    """
+
+    __slots__ = ('game', 'candidates', 'groups', 'alive')
+
+    def __init__(self, game, candidates, groups, alive):
+        self.game = game
+        self.candidates = candidates
+        self.groups = groups
+        self.alive = alive
+
+
+class _BitsetEngine(object):
+    """Evaluates statements with bitwise operations on sets of candidates
+
+    Each group of candidates that share a value is a precomputed bit mask, so
+    restricting a group to the candidates in play is an AND and checking
+    whether a player knows is a check of the number of bits set. Filtering
+    produces a new mask, without building a new Game until one is needed.
+    """
+
+    def start(self, game):
+        candidates = list(game.candidates)
+
+        groups = []
+        for idx in range(len(game.players)):
+            masks = {}
+            for bit, cand in enumerate(candidates):
+                masks[cand[idx]] = masks.get(cand[idx], 0) | 1 << bit
+            groups.append(list(masks.values()))
+
+        alive = (1 << len(candidates)) - 1
+        return _BitsetState(game, candidates, groups, alive)
+
+    def apply(self, state, plan):
+        filtered = self._filtered(state, plan)
+        if not filtered:
+            msg = "No candidates found that satisfy the filtering criterion"
+            raise NoSolutionError(msg)
+
+        return _BitsetState(state.game, state.candidates, state.groups,
+                            filtered)
+
+    def satisfiable(self, state, plan):
+        return self._filtered(state, plan) != 0
+
+    def _filtered(self, state, plan):
+        """Get the mask of the candidates in play a statement is true for"""
+        alive = state.alive
+
+        # for each player, the candidates for which the player would know
+        singletons = {}
+
+        def would_know(idx, group):
+            if _stats is not None:
+                _stats.would_know_calls += 1
+            if idx not in singletons:
+                mask = 0
+                for player_group in state.groups[idx]:
+                    player_group &= alive
+                    if _popcount(player_group) == 1:
+                        mask |= player_group
+                singletons[idx] = mask
+
+            known = group & singletons[idx]
+            if known == group:
+                return Knows.yes
+            elif not known:
+                return Knows.no
+            else:
+                return Knows.maybe
+
+        filtered = 0
+        for group in state.groups[plan.author]:
+            group &= alive
+            if not group:
+                continue
+
+            if plan.author_expected is not None:
+                author_knows = Knows.yes if _popcount(group) == 1 else Knows.no
+                if author_knows != plan.author_expected:
+                    continue
+
+            if all(any(would_know(idx, group) == expected for idx in indices)
+                   for indices, expected in plan.facts):
+                filtered |= group
+
+        return filtered
+
+    def copy(self, state):
+        return state
+
+    def n_alive(self, state):
+        return _popcount(state.alive)
+
+    def to_game(self, state):
+        if state.alive == (1 << len(state.candidates)) - 1:
+            return state.game
+
+        candidates = [cand for bit, cand in enumerate(state.candidates)
+                      if state.alive >> bit & 1]
+        return state.game._derive_subset(candidates)
+
+
+def _popcount(mask):
+    """Count the number of bits set in a non-negative int
+
+    >>> _popcount(0b10110)
+    3
+    """
+    return bin(mask).count('1')
+
+
+def _import_numpy():
+    """Import numpy into the module namespace, if it is not there yet
+
+    Returns
+    -------
+    True if numpy is available, False otherwise.
+    """
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            return False
+        np = numpy
+    return True
+
+
+class _NumpyState(object):
+    """The state of a Game as seen by the numpy engine
+
+    Attributes
+    ----------
+    game: Game
+        The game that the state was started from.
+    candidates: list of tuples
+        The candidates of that game, in a fixed order.
+    codes: list of arrays
+        For each dimension, an integer code for the value of each candidate.
+        Candidates that share a value share a code.
+    alive: array of bool
+        Which candidates are still in play.
+    """
+
+    __slots__ = ('game', 'candidates', 'codes', 'alive')
+
+    def __init__(self, game, candidates, codes, alive):
+        self.game = game
+        self.candidates = candidates
+        self.codes = codes
+        self.alive = alive
+
+
+class _NumpyEngine(object):
+    """Evaluates statements with a few array operations per statement
+
+    Candidates are encoded as one integer code per dimension. A player's group
+    sizes are counted with `bincount`, and a player's knowledge across each
+    group of the author is aggregated from the number of candidates in the
+    group for which the player would know.
+    """
+
+    def start(self, game):
+        # a game sent to another process skips the import in Game.__init__
+        _import_numpy()
+        candidates = list(game.candidates)
+
+        codes = []
+        for idx in range(len(game.players)):
+            value_codes = {}
+            column = [value_codes.setdefault(cand[idx], len(value_codes))
+                      for cand in candidates]
+            codes.append(np.array(column, dtype=np.intp))
+
+        alive = np.ones(len(candidates), dtype=bool)
+        return _NumpyState(game, candidates, codes, alive)
+
+    def apply(self, state, plan):
+        alive = _numpy_filter(state.codes, state.alive, plan)
+        if not alive.any():
+            msg = "No candidates found that satisfy the filtering criterion"
+            raise NoSolutionError(msg)
+
+        return _NumpyState(state.game, state.candidates, state.codes, alive)
+
+    def satisfiable(self, state, plan):
+        return bool(_numpy_filter(state.codes, state.alive, plan).any())
+
+    def copy(self, state):
+        return state
+
+    def n_alive(self, state):
+        return int(state.alive.sum())
+
+    def to_game(self, state):
+        if state.alive.all():
+            return state.game
+
+        candidates = [state.candidates[i] for i in np.flatnonzero(state.alive)]
+        return state.game._derive_subset(candidates)
+
+
+def _numpy_knows(n_yes, n_total):
+    """Aggregate knowledge over groups with numpy, like `knows_cases`
+
+    Parameters
+    ----------
+    n_yes: array
+        For each group, the number of cases in which the player knows.
+    n_total: array
+        For each group, the number of cases.
+
+    Returns
+    -------
+    An array with the value of the Knows enum for each group.
+    """
+    return np.where(n_yes == n_total, Knows.yes.value,
+                    np.where(n_yes == 0, Knows.no.value, Knows.maybe.value))
+
+
+def _numpy_filter(codes, alive, plan):
+    """Filter candidates by a statement using array operations
+
+    Parameters
+    ----------
+    codes: list of arrays
+        For each dimension, the integer code of the group each candidate
+        belongs to. Codes must be non-negative.
+    alive: array of bool
+        Which candidates are still in play.
+    plan: StatementPlan
+        The statement to filter by.
+
+    Returns
+    -------
+    An array of bool with the candidates that are still in play afterwards.
+    """
+
+    author = plan.author
+    author_codes = codes[author][alive]
+    n_author_groups = int(codes[author].max()) + 1
+    n_total = np.bincount(author_codes, minlength=n_author_groups)
+
+    def group_knowledge(idx):
+        if _stats is not None:
+            _stats.would_know_calls += int(np.count_nonzero(n_total))
+        player_codes = codes[idx][alive]
+        sizes = np.bincount(player_codes)
+        yes = sizes[player_codes] == 1
+        n_yes = np.bincount(author_codes, weights=yes,
+                            minlength=n_author_groups)
+        return _numpy_knows(n_yes, n_total)
+
+    true_for = n_total > 0
+    if plan.author_expected is not None:
+        author_knows = np.where(n_total == 1, Knows.yes.value, Knows.no.value)
+        true_for &= author_knows == plan.author_expected.value
+
+    knowledge = {}
+    for indices, expected in plan.facts:
+        matches = np.zeros(n_author_groups, dtype=bool)
+        for idx in indices:
+            if idx not in knowledge:
+                knowledge[idx] = group_knowledge(idx)
+            matches |= knowledge[idx] == expected.value
+        true_for &= matches
+
+    return alive & true_for[codes[author]]
+
+
+class Stats(object):
+    """Operation counts and timings collected from the hot paths
+
+    Collected while inside a `collect_stats` block. Work done in the worker
+    processes of a parallel `find_game` is not counted, except for the number
+    of tries.
+
+    Attributes
+    ----------
+    get_compatible_calls: int
+        Calls to Player.get_compatible.
+    would_know_calls: int
+        Calls to Player.would_know, plus the number of times an engine
+        worked out whether a player would know for a group of the author.
+    true_for_calls: int
+        Calls to Statement.true_for.
+    candidates_scanned: int
+        Candidates looked at, by statements being applied and by
+        get_compatible scanning candidates without an index.
+    statements: dict Statement -> StatementStats
+        The totals for each statement applied by Game.filter or
+        Game.filter_chain, in the order the statements were first applied.
+    n_tries: int
+        The number of games tried by find_game.
+    find_game_seconds: float
+        The wall time spent in find_game.
+    """
+
+    def __init__(self):
+        self.get_compatible_calls = 0
+        self.would_know_calls = 0
+        self.true_for_calls = 0
+        self.candidates_scanned = 0
+        self.statements = {}
+        self.n_tries = 0
+        self.find_game_seconds = 0.0
+
+    @property
+    def n_applied(self):
+        """The number of times any statement was applied"""
+        return sum(s.n_applied for s in self.statements.values())
+
+    @property
+    def tries_per_second(self):
+        """The number of games find_game tried per second"""
+        if not self.find_game_seconds:
+            return 0.0
+        return self.n_tries / self.find_game_seconds
+
+    def __repr__(self):
+        return ('Stats(get_compatible_calls={}, would_know_calls={}, '
+                'true_for_calls={}, candidates_scanned={}, '
+                'n_applied={}, n_tries={}, find_game_seconds={:.6f})'
+                ).format(self.get_compatible_calls, self.would_know_calls,
+                         self.true_for_calls, self.candidates_scanned,
+                         self.n_applied, self.n_tries,
+                         self.find_game_seconds)
+
+
+class StatementStats(object):
+    """What applying one statement cost and what it did, over all the times
+    it was applied
+
+    Attributes
+    ----------
+    statement: Statement
+        The statement that was applied.
+    n_applied: int
+        The number of times the statement was applied.
+    n_before: int
+        The number of candidates in play before the statement, summed over
+        the times it was applied.
+    n_after: int
+        The number of candidates in play after the statement, summed over the
+        times it was applied. Zero for the times no candidates satisfied the
+        statement.
+    seconds: float
+        The wall time it took to apply the statement, in total.
+    """
+
+    __slots__ = ('statement', 'n_applied', 'n_before', 'n_after', 'seconds')
+
+    def __init__(self, statement):
+        self.statement = statement
+        self.n_applied = 0
+        self.n_before = 0
+        self.n_after = 0
+        self.seconds = 0.0
+
+    def add(self, n_before, n_after, seconds):
+        """Count one more time the statement was applied"""
+        self.n_applied += 1
+        self.n_before += n_before
+        self.n_after += n_after
+        self.seconds += seconds
+
+    @property
+    def n_removed(self):
+        """The number of candidates the statement ruled out, in total"""
+        return self.n_before - self.n_after
+
+    def __repr__(self):
+        return ('StatementStats(statement={}, n_applied={}, n_before={}, '
+                'n_after={}, seconds={:.6f})').format(
+                        self.statement, self.n_applied, self.n_before,
+                        self.n_after, self.seconds)
+
+
+_stats = None
+
+
+@contextmanager
+def collect_stats():
+    """Collect operation counts and timings from the hot paths
+
+    Collecting is off unless inside this block, in which case the hot paths
+    only check a module level variable.
+
+    >>> with collect_stats() as stats:
+    ...     game = Game([(1, 2), (1, 3), (2, 3)])
+    ...     game = game.filter(Statement(author='0', facts={'0': Knows.no}))
+    >>> [(s.n_before, s.n_after) for s in stats.statements.values()]
+    [(3, 2)]
+
+    Yields
+    ------
+    Stats
+    """
+    global _stats
+
+    previous = _stats
+    _stats = Stats()
+    try:
+        yield _stats
+    finally:
+        _stats = previous
+
+
+def _apply_plan(engine, state, plan):
+    """Apply a StatementPlan or Repeat with an engine, reporting to any Stats
+    """
+
+    if isinstance(plan, Repeat):
+        return _apply_repeat(engine, state, plan)
+
+    stats = _stats
+    if stats is None:
+        return engine.apply(state, plan)
+
+    n_before = engine.n_alive(state)
+    stats.candidates_scanned += n_before
+    start = time.perf_counter()
+    try:
+        state = engine.apply(state, plan)
+        n_after = engine.n_alive(state)
+        return state
+    except NoSolutionError:
+        n_after = 0
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        statement_stats = stats.statements.get(plan.statement)
+        if statement_stats is None:
+            statement_stats = stats.statements[plan.statement] = \
+                    StatementStats(plan.statement)
+        statement_stats.add(n_before, n_after, seconds)
+
+
+def _apply_repeat(engine, state, repeat):
+    """Apply the rounds of a compiled Repeat, stopping at a fixpoint"""
+
+    for _ in range(repeat.max_rounds):
+        if (repeat.until is not None and
+            engine.satisfiable(state, repeat.until)):
+            break
+
+        n_before = engine.n_alive(state)
+        for plan in repeat.statements:
+            state = _apply_plan(engine, state, plan)
+
+        # statements only ever rule candidates out, so if none were, the
+        # next round would start from the same candidates
+        if engine.n_alive(state) == n_before:
+            break
+
+    return state
+
+
+def _canonical_signature(candidates, n_dims, max_orderings=720):
+    """Relabel the values of candidates in an order that ignores their names
+
+    Values are first colored by refinement: each value starts out with the
+    size of its group, and is then repeatedly distinguished by the colors of
+    the values it appears with. Values are relabeled in the order of their
+    colors. Ties between values of the same color are broken by trying every
+    order of the tied values and keeping the smallest result, unless there
+    are more than `max_orderings` such orders, in which case ties are broken
+    by the repr of the values.
+
+    Parameters
+    ----------
+    candidates: list of tuples
+        The candidates to relabel.
+    n_dims: int
+        The number of dimensions of each candidate.
+    max_orderings: int
+        The maximum number of orders of tied values to try.
+
+    Returns
+    -------
+    A sorted tuple of tuples of ints.
+
+    >>> _canonical_signature([(5, 'b'), (6, 'b'), (6, 'a')], 2)
+    ((0, 1), (1, 0), (1, 1))
+    >>> _canonical_signature([(1, 'x'), (0, 'y'), (1, 'y')], 2)
+    ((0, 1), (1, 0), (1, 1))
+    """
+
+    colors = [Counter(cand[dim] for cand in candidates)
+              for dim in range(n_dims)]
+    n_colors = None
+    while True:
+        profiles = [{} for _ in range(n_dims)]
+        for cand in candidates:
+            cand_colors = tuple(colors[dim][cand[dim]]
+                                for dim in range(n_dims))
+            for dim in range(n_dims):
+                profiles[dim].setdefault(cand[dim], []).append(cand_colors)
+
+        new_colors = []
+        for dim in range(n_dims):
+            profile = {value: (colors[dim][value], tuple(sorted(rows)))
+                       for value, rows in profiles[dim].items()}
+            ranks = {key: rank
+                     for rank, key in enumerate(sorted(set(profile.values())))}
+            new_colors.append({value: ranks[key]
+                               for value, key in profile.items()})
+
+        colors = new_colors
+        new_n_colors = sum(len(set(dim_colors.values()))
+                           for dim_colors in colors)
+        if new_n_colors == n_colors:
+            break
+        n_colors = new_n_colors
+
+    # values of the same color, per dimension
+    tied = []
+    n_orderings = 1
+    for dim in range(n_dims):
+        by_color = {}
+        for value, color in colors[dim].items():
+            by_color.setdefault(color, []).append(value)
+        classes = [sorted(by_color[color], key=repr)
+                   for color in sorted(by_color)]
+        for values in classes:
+            for i in range(2, len(values) + 1):
+                n_orderings *= i
+        tied.append(classes)
+
+    def relabeled(orders):
+        labels = [{value: label for label, value in enumerate(
+                   v for values in dim_order for v in values)}
+                  for dim_order in orders]
+        return tuple(sorted(tuple(labels[dim][cand[dim]]
+                                  for dim in range(n_dims))
+                            for cand in candidates))
+
+    if n_orderings > max_orderings:
+        return relabeled(tied)
+
+    dim_orders = [product(*[permutations(values) for values in classes])
+                  for classes in tied]
+    return min(relabeled(orders) for orders in product(*dim_orders))
+
+
+class LRUCache(object):
+    """A mapping of bounded size that drops the least recently used entries
+
+    Attributes
+    ----------
+    maxsize: int
+        The maximum number of entries to keep.
+    maxbytes: int
+        If given, the maximum estimated size of the keys and values to keep,
+        in bytes.
+    sizeof: function
+        Estimates the size of a key or a value in bytes. By default
+        `sys.getsizeof`, plus that of the items of a tuple, so that the
+        candidates in a key like that of `cache_filters` are counted.
+    hits: int
+        The number of lookups that found an entry.
+    misses: int
+        The number of lookups that did not find an entry.
+    nbytes: int
+        The estimated size of the keys and values kept, in bytes.
+    """
+
+    def __init__(self, maxsize=1024, maxbytes=None, sizeof=None):
+        if sizeof is None:
+            sizeof = _sizeof
+
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.sizeof = sizeof
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+        self._entries = OrderedDict()
+
+    def get(self, key, default=None):
+        """Look up an entry, marking it as recently used"""
+        try:
+            entry = self._entries.pop(key)
+        except KeyError:
+            self.misses += 1
+            return default
+
+        self._entries[key] = entry
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key, value):
+        """Add an entry, dropping the least recently used ones if full"""
+        self._pop(key)
+        nbytes = self.sizeof(key) + self.sizeof(value)
+        self._entries[key] = (value, nbytes)
+        self.nbytes += nbytes
+
+        while len(self._entries) > self.maxsize or (
+                self.maxbytes is not None and self.nbytes > self.maxbytes):
+            _, (_, nbytes) = self._entries.popitem(last=False)
+            self.nbytes -= nbytes
+
+    def _pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.nbytes -= entry[1]
+
+    def clear(self):
+        """Remove all entries and reset the statistics"""
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __repr__(self):
+        return 'LRUCache(maxsize={maxsize}, size={size}, nbytes={nbytes}, ' \
+               'hits={hits}, misses={misses})'.format(maxsize=self.maxsize,
+                                                      size=len(self),
+                                                      nbytes=self.nbytes,
+                                                      hits=self.hits,
+                                                      misses=self.misses)
+
+
+def _sizeof(obj):
+    """Get the size of an object, and of its items if it is a tuple"""
+    nbytes = sys.getsizeof(obj)
+    if isinstance(obj, tuple):
+        nbytes += sum(map(sys.getsizeof, obj))
+    return nbytes
+
+
+_filter_cache = None
+
+
+@contextmanager
+def cache_filters(cache=None):
+    """Cache the results of filtering games by statements
+
+    Inside this block, Game.filter, Game.filter_chain and the methods that
+    use them look up the result of applying each statement to a set of
+    candidates before working it out. Results are keyed by the candidates and
+    the Statement object, so statements are told apart by identity. Repeats
+    are not cached, but the statements applied before and after them are.
+
+    >>> game = Game([(1, 2), (1, 3), (2, 3)])
+    >>> statement = Statement(author='0', facts={'0': Knows.no})
+    >>> with cache_filters() as cache:
+    ...     n_solutions = [game.n_solutions([statement]) for _ in range(3)]
+    >>> cache.hits, cache.misses
+    (2, 1)
+
+    Parameters
+    ----------
+    cache: LRUCache
+        The cache to use. If not given, a new LRUCache of default size.
+
+    Yields
+    ------
+    LRUCache
+    """
+    global _filter_cache
+
+    if cache is None:
+        cache = LRUCache()
+
+    previous = _filter_cache
+    _filter_cache = cache
+    try:
+        yield cache
+    finally:
+        _filter_cache = previous
+
+
+def _filter_cached(game, plan, cache):
+    """Filter a game by a StatementPlan, looking the result up in a cache
+
+    The cache maps the candidates and statement to the candidates that are
+    left, or to False if there are none.
+    """
+    engine = _ENGINES[game.engine]
+    if isinstance(plan, Repeat):
+        return engine.to_game(_apply_plan(engine, engine.start(game), plan))
+
+    key = (game.candidates, plan.statement, plan.player_names)
+    candidates = cache.get(key)
+    if candidates is None:
+        try:
+            state = _apply_plan(engine, engine.start(game), plan)
+        except NoSolutionError:
+            cache.put(key, False)
+            raise
+        candidates = engine.to_game(state).candidates
+        cache.put(key, candidates)
+
+    if candidates is False:
+        msg = "No candidates found that satisfy the filtering criterion"
+        raise NoSolutionError(msg)
+    elif len(candidates) == len(game.candidates):
+        return game
+
+    return game._derive_subset(candidates)
+
+
+def choose_k(k, rng=random):
+    """Get a function that samples K values from a list of choices
+
+    Would be nice to use numpy.random.choice here, but will avoid adding numpy
+    as a dependency.
+
+    Parameters
+    ----------
+    k: int
+        The number of candidates to choose.
+    rng: random.Random
+        The source of randomness. Defaults to the random module itself.
+
+    Returns
+    -------
+    Function
+    """
+
+    def choose_func(choices):
+        return [rng.choice(choices) for _ in range(k)]
+
+    return choose_func
+
+
+def sample_candidates(domains, n_candidates, max_tries=100, rng=random,
+                      multiplicity=None):
+    """Sample N unique candidates from given sets of choices
+
+    Every candidate is a position in the product of the domains. Positions are
+    sampled without replacement and then decoded into tuples, so sampling
+    takes exactly `n_candidates` random draws and never needs to retry, even
+    when nearly every possible candidate is sampled. The product of the
+    domains is never built.
+
+    If `multiplicity` is given, the constrained dimensions are sampled first,
+    as columns in which every value appears an allowed number of times. The
+    other dimensions are sampled value by value. Only samples that happen to
+    contain the same candidate twice are drawn again.
+
+    Parameters
+    ----------
+    domains: list of lists
+        Each sublist contains the possible values that the corresponding
+        dimension can take on.
+    n_candidates: int
+        The number of unique candidates to sample from each domain.
+    max_tries: int
+        The maximum number of times to draw a sample with `multiplicity`,
+        to prevent an infinite loop in cases that cannot be satisfied.
+    rng: random.Random
+        The source of randomness. Defaults to the random module itself.
+    multiplicity: dict int -> (int, int)
+        If given, maps the index of a dimension to the smallest and largest
+        number of candidates that may share each value of that dimension, as
+        derived by `derive_multiplicity`.
+
+    Returns
+    -------
+    A sorted list of tuples
+
+    Raises
+    ------
+    TooManyTriesError
+        If there are fewer than `n_candidates` possible candidates, or no
+        sample that meets `multiplicity` was found.
+
+    >>> random.seed(123)
+    >>> domains = [range(10), range(10, 20), range(20, 30)]
+    >>> sample_candidates(domains, 5)
+    [(0, 15, 23), (0, 18, 29), (2, 17, 24), (4, 11, 27), (7, 18, 27)]
+    >>> domains = [list('abcdef'), range(6)]
+    >>> sample_candidates(domains, 3)
+    [('a', 2), ('b', 0), ('c', 5)]
+    >>> domains = [[0, 1], ['a', 'b']]
+    >>> sample_candidates(domains, 4)
+    [(0, 'a'), (0, 'b'), (1, 'a'), (1, 'b')]
+    >>> domains = [range(10), range(10)]
+    >>> sample_candidates(domains, 4, multiplicity={0: (2, 2)})
+    [(2, 0), (2, 2), (5, 1), (5, 6)]
+    """
+
+    domains = [domain if isinstance(domain, Sequence) else list(domain)
+               for domain in domains]
+
+    n_positions = 1
+    for domain in domains:
+        n_positions *= len(domain)
+
+    if n_candidates > n_positions:
+        msg = "Cannot sample {n} unique candidates out of {total}".format(
+                n=n_candidates,
+                total=n_positions
+                )
+        raise TooManyTriesError(msg)
+
+    if multiplicity:
+        return _sample_with_multiplicity(domains, n_candidates, rng,
+                                         multiplicity, max_tries)
+
+    # Floyd's algorithm: a uniform sample of unique positions from
+    # range(n_positions), with one draw per position
+    positions = set()
+    for upper in range(n_positions - n_candidates, n_positions):
+        position = rng.randrange(upper + 1)
+        positions.add(upper if position in positions else position)
+
+    candidates = []
+    for position in sorted(positions):
+        cand = []
+        for domain in reversed(domains):
+            position, code = divmod(position, len(domain))
+            cand.append(domain[code])
+        candidates.append(tuple(reversed(cand)))
+
+    return sorted(candidates)
+
+
+def _sample_with_multiplicity(domains, n_candidates, rng, multiplicity,
+                              max_tries):
+    """Sample unique candidates whose values appear a given number of times
+
+    See `sample_candidates`.
+    """
+
+    for _ in range(max_tries):
+        columns = []
+        for dim, domain in enumerate(domains):
+            if dim in multiplicity:
+                columns.append(_sample_column(domain, n_candidates, rng,
+                                              *multiplicity[dim]))
+            else:
+                columns.append([rng.choice(domain)
+                                for _ in range(n_candidates)])
+
+        candidates = list(zip(*columns))
+        if len(set(candidates)) == n_candidates:
+            return sorted(candidates)
+
+    msg = "No sample with the given multiplicity in {} tries".format(max_tries)
+    raise TooManyTriesError(msg)
+
+
+def _sample_column(domain, n_candidates, rng, min_count, max_count):
+    """Sample the values of one dimension, repeating each value as allowed
+
+    Parameters
+    ----------
+    domain: sequence
+        The possible values.
+    n_candidates: int
+        The number of values to sample.
+    rng: random.Random
+        The source of randomness.
+    min_count, max_count: int
+        The smallest and largest number of times each sampled value may
+        appear.
+
+    Returns
+    -------
+    A list of values in random order.
+
+    Raises
+    ------
+    TooManyTriesError
+        If no column meets the constraints.
+    """
+
+    # the number of distinct values that can make up n_candidates
+    n_values = [k for k in range(1, len(domain) + 1)
+                if k * min_count <= n_candidates <= k * max_count]
+    if not n_values:
+        msg = "Cannot have {n} candidates with {lo} to {hi} per value".format(
+                n=n_candidates,
+                lo=min_count,
+                hi=max_count
+                )
+        raise TooManyTriesError(msg)
+
+    k = rng.choice(n_values)
+    counts = [min_count] * k
+    for _ in range(n_candidates - k * min_count):
+        counts[rng.choice([i for i in range(k) if counts[i] < max_count])] += 1
+
+    column = []
+    for value, count in zip(rng.sample(domain, k), counts):
+        column.extend([value] * count)
+    rng.shuffle(column)
+
+    return column
+
+
+def derive_multiplicity(statements, player_names=None):
+    """Derive multiplicity constraints from the first Statement
+
+    If the first statement has its author say that they do not know, every
+    candidate whose value is shared by no other candidate in the author's
+    dimension is ruled out right away. Requiring every value of the author's
+    dimension to be shared by at least two candidates makes sure that no
+    sampled candidate is wasted in this way.
+
+    Only the first statement is used. If later statements were used in the
+    same way, the first statements would not rule out any candidates at all,
+    and a chain of statements that repeats would never get anywhere.
+
+    Parameters
+    ----------
+    statements: list of Statements
+        The statements made by the players about who knows what.
+    player_names: list of str
+        The names of the players. If not given, players are named after the
+        index of the dimension they are told about.
+
+    Returns
+    -------
+    A dict mapping the index of a dimension to the smallest and largest
+    number of candidates that may share each of its values, to be passed
+    to `sample_candidates`.
+
+    >>> derive_multiplicity([Statement(author='1', facts={'1': Knows.no})])
+    {1: (2, inf)}
+    >>> derive_multiplicity([Statement(author='1', facts={'1': Knows.yes})])
+    {}
+
+    Raises
+    ------
+    InvalidStatementError
+        If the author of the first statement is not one of the players.
+    """
+
+    if not statements:
+        return {}
+
+    statement = statements[0]
+    while isinstance(statement, Repeat):
+        if statement.until is not None or statement.max_rounds < 1:
+            return {}
+        statement = statement.statements[0]
+
+    if statement.facts.get(statement.author) != Knows.no:
+        return {}
+
+    try:
+        if player_names is None:
+            author = int(statement.author)
+        else:
+            author = list(player_names).index(statement.author)
+    except ValueError:
+        msg = "Unknown player '{}'".format(statement.author)
+        raise InvalidStatementError(msg)
+
+    return {author: (2, float('inf'))}
+
+
+def find_game(domains, n_candidates, statements, n_tries, player_names=None, 
+              seed=123, engine='python', n_workers=None, chunk_size=100,
+              batch_size=None, cache=None, multiplicity=None):
+    """Find a game that satisfies a given list of Statements
+
+    Find a Game object that has a unique solution under the given Statements.
+    Raises NoGameFoundError if no such game is found.
+
+    Parameters
+    ----------
+    domains: list of lists
+        Each sublist contains the possible values that the corresponding
         dimension can take on.
     n_candidates: int
         The number of unique candidates to sample from each domain.
@@ -524,6 +2676,41 @@ def find_game(domains, n_candidates, statements, n_tries, player_names=None,
         named after the index of the dimension he is told about.
     seed: int
         The value to set the random seed to, for reproducibility of results.
+    engine: str
+        The name of the engine the games use to evaluate statements.
+    n_workers: int
+        If given, the tries are spread over this many worker processes. Each
+        worker samples from its own random stream seeded from `seed` and its
+        position. The game found earliest in a worker's stream is returned,
+        and of those the one of the first worker, so results only depend on
+        `seed` and `n_workers`. The global random state is left alone in this
+        case.
+    chunk_size: int
+        When using workers, the number of tries each worker makes before the
+        workers check whether any of them has found a game. It does not change
+        the game that is found.
+    batch_size: int
+        If given, games are sampled and evaluated this many at a time with
+        numpy, which needs to be installed. The first game in sampling order
+        that has a unique solution is returned. Games are drawn from a numpy
+        random generator seeded with `seed`, so they differ from the games
+        tried otherwise.
+    cache: LRUCache
+        If given, the number of solutions of each game is stored in this cache
+        under the game's signature, the statements and the player names, and
+        games with the same structure as one tried before are not evaluated
+        again. Signatures are only worked out while they save more time than
+        they take, which for games that are quick to solve may be never. The
+        cache can be shared between calls. It is not used together with
+        `n_workers` or `batch_size`.
+    multiplicity: dict int -> (int, int) or 'auto'
+        If given, only sample games in which the number of candidates that
+        share each value of a dimension is within the given bounds, see
+        `sample_candidates`. If 'auto', the bounds are derived from the
+        leading statements with `derive_multiplicity`, so that the search is
+        limited to games in which leading statements about the author not
+        knowing do not rule out any candidates. Cannot be used together with
+        `batch_size`.
 
     Returns
     -------
@@ -532,25 +2719,665 @@ def find_game(domains, n_candidates, statements, n_tries, player_names=None,
     Raises
     ------
     NoGameFoundError
+    IncompatibleArgumentsError
+        If `multiplicity` is used together with `batch_size`.
+    """
+
+    stats = _stats
+    start = time.perf_counter()
+    try:
+        return _find_game(domains, n_candidates, statements, n_tries,
+                          player_names, seed, engine, n_workers, chunk_size,
+                          batch_size, cache, multiplicity)
+    finally:
+        if stats is not None:
+            stats.find_game_seconds += time.perf_counter() - start
+
+
+def _find_game(domains, n_candidates, statements, n_tries, player_names, seed,
+               engine, n_workers, chunk_size, batch_size, cache, multiplicity):
+    """Find a game that satisfies a given list of Statements, see `find_game`
     """
 
+    if multiplicity == 'auto':
+        multiplicity = derive_multiplicity(statements, player_names)
+
+    if batch_size is not None:
+        if multiplicity:
+            msg = "multiplicity cannot be used together with batch_size"
+            raise IncompatibleArgumentsError(msg)
+
+        return _find_game_batched(domains, n_candidates, statements, n_tries,
+                                  player_names, seed, engine, batch_size)
+
+    if n_workers is not None:
+        return _find_game_parallel(domains, n_candidates, statements, n_tries,
+                                   player_names, seed, engine, n_workers,
+                                   chunk_size, multiplicity)
+
     random.seed(seed)
 
+    candidates, n_solutions = _try_games(domains, n_candidates, statements,
+                                         n_tries, player_names, engine,
+                                         rng=random, cache=cache,
+                                         multiplicity=multiplicity)
+    if candidates is not None:
+        return Game(candidates, player_names, engine=engine)
+
+    msg = repr(Counter(n_solutions))
+    raise NoGameFoundError(msg)
+
+
+def _try_games(domains, n_candidates, statements, n_tries, player_names,
+               engine, rng, cache=None, multiplicity=None):
+    """Sample and test games until one has a unique solution
+
+    Returns
+    -------
+    A tuple of the candidates of the game that was found, or None, and the
+    list of the number of solutions of each game that was tried and failed.
+    """
+
+    game = None
+    memo = None
     n_solutions = []
     for _ in range(n_tries):
-        candidates = sample_candidates(domains, n_candidates)
-        game = Game(candidates, player_names)
+        if _stats is not None:
+            _stats.n_tries += 1
+
+        candidates = sample_candidates(domains, n_candidates, rng=rng,
+                                       multiplicity=multiplicity)
+
+        # check the names and compile once, the players and plans can be
+        # reused for every game
+        if game is None:
+            game = Game(candidates, player_names, engine=engine)
+            plans = game.compile(statements)
+        else:
+            game = game._derive(candidates)
+
+        if cache is None:
+            my_n_solutions = game.n_solutions(plans)
+        else:
+            if memo is None:
+                memo = _SignatureMemo(cache, statements,
+                                      game.get_player_names())
+            my_n_solutions = memo.n_solutions(game, plans)
 
-        my_n_solutions = game.n_solutions(statements)
         if my_n_solutions == 1:
-            return game
+            return candidates, n_solutions
 
         n_solutions.append(my_n_solutions)
 
-    msg = repr(Counter(n_solutions))
+    return None, n_solutions
+
+
+class _SignatureMemo(object):
+    """Looks up the number of solutions of games by their structure
+
+    Working out the signature of a small game can take longer than solving
+    it, so signatures are avoided where they cannot pay off. Games are first
+    looked up by their candidates, which catches games that are tried again,
+    and then by a cheap invariant, the sorted group sizes of each dimension.
+    A game with an invariant that was not seen before is solved right away.
+    Only a game with the invariant of a game seen before is looked up by its
+    signature.
+
+    Looking games up is given up on if, after the first `n_trial` games, the
+    time it took is more than the time it saved by not solving games.
+
+    Attributes
+    ----------
+    cache: LRUCache
+        The numbers of solutions, under the candidates or the signature of
+        each game, the statements and the player names, and the invariants
+        that were seen.
+    statements: tuple
+        The statements the games are solved for.
+    player_names: tuple of str
+        The names of the players of the games, which decide which dimension
+        each statement is about.
+    """
+
+    n_trial = 20
+
+    def __init__(self, cache, statements, player_names):
+        self.cache = cache
+        self.statements = tuple(statements)
+        self.player_names = tuple(player_names)
+        self.n_games = 0
+        self.n_hits = 0
+        self.seconds = 0.0
+        self.n_solved = 0
+        self.solve_seconds = 0.0
+
+    def n_solutions(self, game, plans):
+        """Get the number of solutions of a game, solving it if needed"""
+        if self.n_games >= self.n_trial:
+            # if every game was found, solve one to know what a hit saves
+            if not self.n_solved:
+                return self._solve(game, plans)
+
+            saved = self.n_hits * self.solve_seconds / self.n_solved
+            if saved < self.seconds - self.solve_seconds:
+                return game.n_solutions(plans)
+
+        start = time.perf_counter()
+        n_solutions = self._look_up(game, plans)
+        self.seconds += time.perf_counter() - start
+        self.n_games += 1
+        return n_solutions
+
+    def _look_up(self, game, plans):
+        exact = ('game', game.candidates, self.statements, self.player_names)
+        n_solutions = self.cache.get(exact)
+        if n_solutions is not None:
+            self.n_hits += 1
+            return n_solutions
+
+        shape = ('shape', tuple(tuple(sorted(map(len, index.values())))
+                                for index in game.value_index),
+                 self.statements, self.player_names)
+        if self.cache.get(shape) is None:
+            n_solutions = self._solve(game, plans)
+            self.cache.put(shape, True)
+        else:
+            key = ('signature', game.signature(), self.statements,
+                   self.player_names)
+            n_solutions = self.cache.get(key)
+            if n_solutions is None:
+                n_solutions = self._solve(game, plans)
+                self.cache.put(key, n_solutions)
+            else:
+                self.n_hits += 1
+
+        self.cache.put(exact, n_solutions)
+        return n_solutions
+
+    def _solve(self, game, plans):
+        start = time.perf_counter()
+        n_solutions = game.n_solutions(plans)
+        self.solve_seconds += time.perf_counter() - start
+        self.n_solved += 1
+        return n_solutions
+
+
+def _try_games_chunk(domains, n_candidates, statements, n_tries, player_names,
+                     engine, rng_state, multiplicity):
+    """Run `_try_games` in a worker, continuing from a random state
+
+    Returns
+    -------
+    The result of `_try_games` and the random state to continue from.
+    """
+    rng = random.Random()
+    rng.setstate(rng_state)
+    candidates, n_solutions = _try_games(domains, n_candidates, statements,
+                                         n_tries, player_names, engine, rng,
+                                         multiplicity=multiplicity)
+    return candidates, n_solutions, rng.getstate()
+
+
+def _find_game_parallel(domains, n_candidates, statements, n_tries,
+                        player_names, seed, engine, n_workers, chunk_size,
+                        multiplicity):
+    """Find a game using a pool of worker processes, see `find_game`"""
+
+    rng_states = [random.Random('{}-{}'.format(seed, worker)).getstate()
+                  for worker in range(n_workers)]
+    remaining = [n_tries // n_workers + (worker < n_tries % n_workers)
+                 for worker in range(n_workers)]
+
+    n_solutions = Counter()
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        while any(remaining):
+
+            futures = []
+            for worker in range(n_workers):
+                n_chunk = min(chunk_size, remaining[worker])
+                remaining[worker] -= n_chunk
+                futures.append(executor.submit(
+                        _try_games_chunk, domains, n_candidates, statements,
+                        n_chunk, player_names, engine, rng_states[worker],
+                        multiplicity
+                        ))
+
+            # every worker has made the same number of tries from its stream
+            # so far, so the game found earliest in its stream, and then by
+            # the first worker, does not depend on the chunk size or on which
+            # worker happens to finish first
+            found = []
+            for worker, future in enumerate(futures):
+                candidates, chunk_n_solutions, rng_states[worker] = \
+                        future.result()
+                if _stats is not None:
+                    _stats.n_tries += len(chunk_n_solutions)
+                    _stats.n_tries += candidates is not None
+                if candidates is not None:
+                    found.append((len(chunk_n_solutions), worker, candidates))
+
+                n_solutions.update(chunk_n_solutions)
+
+            if found:
+                candidates = min(found)[2]
+                return Game(candidates, player_names, engine=engine)
+
+    msg = repr(n_solutions)
+    raise NoGameFoundError(msg)
+
+
+def _find_game_batched(domains, n_candidates, statements, n_tries,
+                       player_names, seed, engine, batch_size):
+    """Find a game by evaluating batches of games with numpy, see `find_game`
+    """
+
+    if not _import_numpy():
+        msg = "Batched find_game requires numpy to be installed"
+        raise BadEngineError(msg)
+
+    domains = [list(domain) for domain in domains]
+    sizes = [len(domain) for domain in domains]
+    if player_names is None:
+        player_names = [str(i) for i in range(len(domains))]
+    plans = _compile_all(statements, tuple(player_names))
+
+    rng = np.random.default_rng(seed)
+    n_solutions = Counter()
+    n_tried = 0
+    while n_tried < n_tries:
+        n_games = min(batch_size, n_tries - n_tried)
+        n_tried += n_games
+        if _stats is not None:
+            _stats.n_tries += n_games
+
+        # one row of integer codes per candidate, one slab per game
+        codes = _sample_codes(rng, sizes, n_candidates, n_games)
+
+        # give every game its own range of group codes, so that all games of
+        # the batch can be filtered at once
+        game_offsets = np.repeat(np.arange(n_games), n_candidates)
+        group_codes = [game_offsets * size + codes[:, :, idx].ravel()
+                       for idx, size in enumerate(sizes)]
+
+        alive = np.ones(n_games * n_candidates, dtype=bool)
+        for plan in plans:
+            alive = _numpy_filter_games(group_codes, alive, plan, n_games)
+
+        batch_n_solutions = alive.reshape(n_games, n_candidates).sum(axis=1)
+        found = np.flatnonzero(batch_n_solutions == 1)
+        if found.size:
+            n_solutions.update(batch_n_solutions[:found[0]].tolist())
+            candidates = sorted(
+                    tuple(domain[code] for domain, code in zip(domains, row))
+                    for row in codes[found[0]].tolist()
+                    )
+            return Game(candidates, player_names, engine=engine)
+
+        n_solutions.update(batch_n_solutions.tolist())
+
+    msg = repr(n_solutions)
     raise NoGameFoundError(msg)
 
 
+def _numpy_filter_games(codes, alive, plan, n_games):
+    """Filter a batch of games of the same size by a StatementPlan or Repeat
+
+    Each game of a Repeat stops at its own fixpoint or `until`, so the result
+    is the same as filtering the games one at a time.
+    """
+    if not isinstance(plan, Repeat):
+        return _numpy_filter(codes, alive, plan)
+
+    for _ in range(plan.max_rounds):
+        games_alive = alive.reshape(n_games, -1)
+        active = games_alive.any(axis=1)
+        if plan.until is not None:
+            until_alive = _numpy_filter(codes, alive, plan.until)
+            active &= ~until_alive.reshape(n_games, -1).any(axis=1)
+        if not active.any():
+            break
+
+        new_alive = alive
+        for statement in plan.statements:
+            new_alive = _numpy_filter_games(codes, new_alive, statement,
+                                            n_games)
+
+        # games that have stopped keep their candidates
+        new_alive = np.where(active[:, None],
+                             new_alive.reshape(n_games, -1), games_alive)
+        new_alive = new_alive.ravel()
+        if (new_alive == alive).all():
+            break
+        alive = new_alive
+
+    return alive
+
+
+def _sample_codes(rng, sizes, n_candidates, n_games):
+    """Sample games of unique candidates as integer codes with numpy
+
+    Parameters
+    ----------
+    rng: numpy.random.Generator
+        The source of randomness.
+    sizes: list of int
+        The number of values in each dimension.
+    n_candidates: int
+        The number of unique candidates in each game.
+    n_games: int
+        The number of games to sample.
+
+    Returns
+    -------
+    An array of shape (n_games, n_candidates, n_dims) with the code of each
+    value. Within each game, candidates are sorted.
+    """
+
+    n_positions = 1
+    for size in sizes:
+        n_positions *= size
+
+    if n_candidates > n_positions:
+        msg = "Cannot sample {n} unique candidates out of {total}".format(
+                n=n_candidates,
+                total=n_positions
+                )
+        raise TooManyTriesError(msg)
+
+    if n_games * n_positions <= 2 ** 16:
+        # pick the positions with the smallest random keys
+        keys = rng.random((n_games, n_positions))
+        positions = np.argpartition(keys, n_candidates - 1, axis=1)
+        positions = positions[:, :n_candidates]
+    elif n_candidates * n_candidates > n_positions:
+        # repeats are common, so sample each game without replacement
+        positions = np.array([rng.choice(n_positions, n_candidates,
+                                         replace=False)
+                              for _ in range(n_games)])
+    else:
+        # for large domains repeats are rare, so resample games that have any
+        positions = rng.integers(n_positions, size=(n_games, n_candidates))
+        while True:
+            positions.sort(axis=1)
+            repeats = (np.diff(positions, axis=1) == 0).any(axis=1)
+            if not repeats.any():
+                break
+            positions[repeats] = rng.integers(
+                    n_positions, size=(int(repeats.sum()), n_candidates))
+
+    positions.sort(axis=1)
+
+    codes = np.empty((n_games, n_candidates, len(sizes)), dtype=np.intp)
+    for idx in reversed(range(len(sizes))):
+        codes[:, :, idx] = positions % sizes[idx]
+        positions = positions // sizes[idx]
+
+    return codes
+
+
+def enumerate_games(domains, n_candidates, statements=None, player_names=None,
+                    resume_after=None, engine='python'):
+    """Generate every game for the given domains, up to renaming of values
+
+    Games are generated in an orderly way: candidates are encoded by the
+    position of their values in the domains, and a game is only extended, or
+    generated, if its sorted codes are the smallest that any renaming of the
+    values within each dimension would give. Since the first candidates of
+    such a game are the smallest for their own renamings, games that can only
+    lead to duplicates are never extended. Games are generated in order of
+    their sorted codes, one at a time.
+
+    Parameters
+    ----------
+    domains: list of lists
+        Each sublist contains the possible values that the corresponding
+        dimension can take on.
+    n_candidates: int
+        The number of unique candidates in each game.
+    statements: list of Statements
+        If given, only games that have a unique solution under these
+        statements are generated.
+    player_names: list of str
+        The list of player names to use. If not given, each player will be
+        named after the index of the dimension he is told about.
+    resume_after: list of tuples
+        If given, the candidates of a game generated before. Generation
+        resumes with the game after it.
+    engine: str
+        The name of the engine the games use to evaluate statements.
+
+    Returns
+    -------
+    A generator of Game objects
+
+    >>> games = enumerate_games([range(2), range(2)], 2)
+    >>> [sorted(game.candidates) for game in games]
+    [[(0, 0), (0, 1)], [(0, 0), (1, 0)], [(0, 0), (1, 1)]]
+    """
+
+    domains = [list(domain) for domain in domains]
+    positions = list(product(*[range(len(domain)) for domain in domains]))
+
+    resume = None
+    if resume_after is not None:
+        value_codes = [{value: code for code, value in enumerate(domain)}
+                       for domain in domains]
+        resume = sorted(tuple(value_codes[dim][value]
+                              for dim, value in enumerate(cand))
+                        for cand in resume_after)
+
+    def extend(codes, start):
+        if len(codes) == n_candidates:
+            yield codes
+            return
+
+        n_needed = n_candidates - len(codes)
+        for pos in range(start, len(positions) - n_needed + 1):
+            new_codes = codes + [positions[pos]]
+
+            # everything that starts like this comes before the resume point
+            if resume is not None and new_codes < resume[:len(new_codes)]:
+                continue
+
+            if _is_canonical(new_codes):
+                for game_codes in extend(new_codes, pos + 1):
+                    yield game_codes
+
+    game = None
+    for codes in extend([], 0):
+        if resume is not None and codes <= resume:
+            continue
+
+        candidates = [tuple(domain[code] for domain, code in zip(domains, cand))
+                      for cand in codes]
+        if game is None:
+            game = Game(candidates, player_names, engine=engine)
+            if statements is not None:
+                plans = game.compile(statements)
+        else:
+            game = game._derive(candidates)
+
+        if statements is None:
+            yield game
+            continue
+
+        if game.n_solutions(plans) == 1:
+            yield game
+
+
+def _is_canonical(codes):
+    """Are sorted codes the smallest under renaming values in each dimension?
+
+    Parameters
+    ----------
+    codes: list of tuples of int
+        The sorted codes of the candidates of a game.
+
+    Returns
+    -------
+    bool
+
+    >>> _is_canonical([(0, 0), (0, 1), (1, 0)])
+    True
+    >>> _is_canonical([(0, 0), (1, 0), (1, 1)])
+    False
+    """
+
+    n_dims = len(codes[0])
+
+    # renaming values in the order they first appear never makes codes
+    # larger, so in the smallest codes values first appear in order
+    for dim in range(n_dims):
+        n_seen = 0
+        for cand in codes:
+            if cand[dim] > n_seen:
+                return False
+            elif cand[dim] == n_seen:
+                n_seen += 1
+
+    # build the smallest codes one candidate at a time, by giving the values of
+    # the next candidate the smallest labels that are still free, and try
+    # each candidate that is tied for being next
+    def search(remaining, labels, pos):
+        images = []
+        for cand in remaining:
+            image = tuple(labels[dim].get(cand[dim], len(labels[dim]))
+                          for dim in range(n_dims))
+            images.append((image, cand))
+
+        smallest = min(image for image, _ in images)
+        if smallest != codes[pos]:
+            return smallest > codes[pos]
+        elif pos + 1 == len(codes):
+            return True
+
+        for image, cand in images:
+            if image != smallest:
+                continue
+
+            new_labels = [dict(dim_labels) for dim_labels in labels]
+            for dim in range(n_dims):
+                new_labels[dim].setdefault(cand[dim], image[dim])
+
+            if not search(remaining - {cand}, new_labels, pos + 1):
+                return False
+
+        return True
+
+    return search(frozenset(codes), [{} for _ in range(n_dims)], 0)
+
+
+def find_dialogues(game, statements, max_length):
+    """Find sequences of statements that give a game a unique solution
+
+    Sequences are explored breadth first, one statement at a time. A
+    sequence is not extended if no candidates satisfy it, or if it leaves the
+    same candidates in play as a sequence explored before, since every
+    extension of it would then lead to candidates that were reached already.
+    So for each set of candidates that can be reached, only the first of the
+    shortest sequences that reach it is explored.
+
+    Parameters
+    ----------
+    game: Game
+        The game to find sequences of statements for.
+    statements: list of Statement, StatementPlan or Repeat
+        The statements to build sequences from. A statement may appear more
+        than once in a sequence.
+    max_length: int
+        The largest number of statements in a sequence.
+
+    Returns
+    -------
+    A generator of (list of statements, solution) tuples, one for each
+    solution that can be reached, shortest sequences first.
+
+    >>> game = Game([('May', 15), ('May', 16), ('May', 19), ('June', 17),
+    ...              ('June', 18), ('July', 14), ('July', 16), ('Aug', 14),
+    ...              ('Aug', 15), ('Aug', 17)],
+    ...             player_names=['Albert', 'Bernard'])
+    >>> pool = statement_pool(['Albert', 'Bernard'])
+    >>> [(len(dialogue), solution)
+    ...  for dialogue, solution in find_dialogues(game, pool, 3)]
+    [(2, ('June', 17)), (3, ('July', 16)), (3, ('Aug', 17))]
+    """
+
+    plans = game.compile(statements)
+    engine = _ENGINES[game.engine]
+
+    seen = {game.candidates}
+    frontier = [(game, [])]
+    for _ in range(max_length):
+        next_frontier = []
+        for state_game, dialogue in frontier:
+            for statement, plan in zip(statements, plans):
+                try:
+                    state = _apply_plan(engine, engine.start(state_game), plan)
+                except NoSolutionError:
+                    continue
+
+                new_game = engine.to_game(state)
+                if new_game.candidates in seen:
+                    continue
+                seen.add(new_game.candidates)
+
+                new_dialogue = dialogue + [statement]
+                if len(new_game.candidates) == 1:
+                    solution, = new_game.candidates
+                    yield new_dialogue, solution
+                else:
+                    next_frontier.append((new_game, new_dialogue))
+
+        frontier = next_frontier
+
+
+def statement_pool(player_names, knows_values=None):
+    """Make the statements that say what the author and one other player know
+
+    For each author, there is a statement about the author's knowledge alone,
+    and one for each combination of that with the knowledge of one other
+    player.
+
+    >>> len(statement_pool(['Albert', 'Bernard']))
+    12
+
+    Parameters
+    ----------
+    player_names: list of str
+        The names of the players.
+    knows_values: list of Knows
+        The knowledge the statements can attribute to a player, by default
+        Knows.no and Knows.yes. An author either knows or does not, so
+        Knows.maybe is only used for other players.
+
+    Returns
+    -------
+    A list of Statements
+    """
+
+    if knows_values is None:
+        knows_values = [Knows.no, Knows.yes]
+
+    statements = []
+    for author in player_names:
+        for author_knows in knows_values:
+            if author_knows == Knows.maybe:
+                continue
+
+            statements.append(Statement(author=author,
+                                        facts={author: author_knows}))
+            for other in player_names:
+                if other == author:
+                    continue
+                for other_knows in knows_values:
+                    statements.append(Statement(
+                            author=author,
+                            facts={author: author_knows, other: other_knows}
+                            ))
+
+    return statements
+
+
 class Knows(Enum):
     """Enum to represent different states of knowledge"""
 
@@ -619,6 +3446,13 @@ def knows_cases(cases):
         return Knows.maybe
 
 
+_ENGINES = {
+    'python': _PythonEngine(),
+    'bitset': _BitsetEngine(),
+    'numpy': _NumpyEngine(),
+    }
+
+
 class Error(Exception):
     """Exception base class for this module"""
     pass
@@ -627,6 +3461,10 @@ class BadPlayerNamesError(Error):
     """Names passed to Game are bad, e.g. contain duplicates"""
     pass
 
+class BadEngineError(Error):
+    """Engine passed to Game is unknown or its dependencies are missing"""
+    pass
+
 class NoSolutionError(Error):
     """A Game has reached a state without a solution for at least one Player"""
     pass
@@ -646,3 +3484,7 @@ class MultipleSolutionsError(Error):
 class TooManyTriesError(Error):
     """Too many tries in finding a sample of candidates"""
     pass
+
+class IncompatibleArgumentsError(Error):
+    """Arguments passed to a function cannot be used together"""
+    pass
@@ -0,0 +1,225 @@
+"""Solve and generate puzzles in bulk, as JSON lines
+
+In solve mode, each input line is a puzzle:
+
+    {"candidates": [...], "player_names": [...], "statements": [...]}
+
+with statements encoded by `Statement.to_dict`, and any other keys, like an
+"id", copied to the output. Each output line is the result of one puzzle, as
+given by `ChainResult.to_dict`, or an "error" if the puzzle could not be
+read, with the other keys of the input line in either case. Results are
+written in input order.
+
+In generate mode, `find_game` is run for every combination of the given
+numbers of candidates and seeds, with the domains, statements, and
+optionally the player names and multiplicity, of a JSON spec file. Each
+output line is the game that was found and its solution, or an "error".
+
+Only a bounded number of lines is held in memory at a time, however long the
+input is.
+
+Usage
+-----
+    python cheryl_batch.py solve puzzles.jsonl -o results.jsonl
+    cat puzzles.jsonl | python cheryl_batch.py solve --workers 4
+    python cheryl_batch.py generate spec.json --n-candidates 8 10 \\
+        --seeds 1 2 3 --n-tries 10000
+"""
+
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice, product
+import json
+import os
+import sys
+
+from cheryl import (Game, find_game, statement_from_dict,
+                    multiplicity_from_dict, error_to_dict, Error)
+
+
+def solve_line(line):
+    """Solve the puzzle of one input line
+
+    Returns
+    -------
+    A dict with the result, or with an error if the line is not a puzzle.
+    """
+    puzzle = None
+    try:
+        puzzle = json.loads(line)
+        if not isinstance(puzzle, dict):
+            raise TypeError("A puzzle must be a JSON object")
+        game = Game.from_dict(puzzle, engine=puzzle.get('engine', 'python'))
+        statements = [statement_from_dict(statement)
+                      for statement in puzzle['statements']]
+        result, = game.evaluate_chains([statements])
+    except (Error, ValueError, TypeError, LookupError) as e:
+        result = None
+        error = e
+
+    if isinstance(puzzle, dict):
+        output = {key: value for key, value in puzzle.items()
+                  if key not in ('candidates', 'player_names', 'statements',
+                                 'engine')}
+    else:
+        output = {}
+
+    if result is None:
+        output['error'] = error_to_dict(error)
+    else:
+        output.update(result.to_dict())
+    return output
+
+
+def generate_one(spec, n_candidates, seed, n_tries):
+    """Run find_game for one point of the parameter grid
+
+    Returns
+    -------
+    A dict with the parameters, and the game and its solution or an error.
+    """
+    output = {'n_candidates': n_candidates, 'seed': seed}
+    try:
+        statements = [statement_from_dict(statement)
+                      for statement in spec['statements']]
+        game = find_game(spec['domains'], n_candidates, statements, n_tries,
+                         player_names=spec.get('player_names'), seed=seed,
+                         engine=spec.get('engine', 'python'),
+                         multiplicity=multiplicity_from_dict(
+                                 spec.get('multiplicity')))
+    except (Error, ValueError, TypeError, LookupError) as e:
+        output['error'] = error_to_dict(e)
+        return output
+
+    output['game'] = game.to_dict()
+    output['solution'] = list(game.get_solution(statements))
+    return output
+
+
+def _call_all(func, args_list):
+    """Call a function for each of a list of arguments"""
+    return [func(*args) for args in args_list]
+
+
+def map_ordered(func, args_iter, n_workers=None, chunk_size=64,
+                max_pending=None):
+    """Call a function for each of a stream of arguments, in a worker pool
+
+    Arguments are sent to the workers in chunks, and at most `max_pending`
+    chunks are in flight at any time, so memory use does not grow with the
+    length of the stream. Results are yielded in order.
+
+    Parameters
+    ----------
+    func: function
+        A function that can be sent to worker processes.
+    args_iter: iterable of tuples
+        The arguments of each call.
+    n_workers: int
+        The number of worker processes. If 0, calls are made in this
+        process.
+    chunk_size: int
+        The number of calls sent to a worker at a time.
+    max_pending: int
+        The largest number of chunks in flight, by default four per worker.
+
+    Yields
+    ------
+    The result of each call
+    """
+    args_iter = iter(args_iter)
+    chunks = iter(lambda: list(islice(args_iter, chunk_size)), [])
+
+    if n_workers == 0:
+        for chunk in chunks:
+            for result in _call_all(func, chunk):
+                yield result
+        return
+
+    if max_pending is None:
+        max_pending = 4 * (n_workers or os.cpu_count() or 1)
+
+    with ProcessPoolExecutor(n_workers) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(_call_all, func, chunk))
+            while len(pending) >= max_pending:
+                for result in pending.popleft().result():
+                    yield result
+
+        while pending:
+            for result in pending.popleft().result():
+                yield result
+
+
+def _write_lines(outputs, f):
+    for output in outputs:
+        f.write(json.dumps(output))
+        f.write('\n')
+
+
+def _open(path, mode):
+    if path == '-':
+        return sys.stdin if 'r' in mode else sys.stdout
+    return open(path, mode)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int,
+                        help='number of worker processes, 0 to work in this '
+                             'process')
+    parser.add_argument('--chunk-size', type=int, default=64,
+                        help='number of lines sent to a worker at a time')
+    parser.add_argument('-o', '--output', default='-',
+                        help='where to write the results, - for stdout')
+    modes = parser.add_subparsers(dest='mode')
+    modes.required = True
+
+    solve = modes.add_parser('solve', help='solve puzzles')
+    solve.add_argument('input', nargs='?', default='-',
+                       help='the puzzles, one per line, - for stdin')
+
+    generate = modes.add_parser('generate', help='generate puzzles')
+    generate.add_argument('spec',
+                          help='a JSON file with domains, statements and '
+                               'optionally player_names and multiplicity')
+    generate.add_argument('--n-candidates', type=int, nargs='+',
+                          required=True,
+                          help='the numbers of candidates to try')
+    generate.add_argument('--seeds', type=int, nargs='+', default=[123],
+                          help='the seeds to try')
+    generate.add_argument('--n-tries', type=int, default=1000,
+                          help='the number of tries for each combination')
+
+    args = parser.parse_args(argv)
+
+    if args.mode == 'solve':
+        f = _open(args.input, 'r')
+        calls = ((line,) for line in f if line.strip())
+        outputs = map_ordered(solve_line, calls, n_workers=args.workers,
+                              chunk_size=args.chunk_size)
+    else:
+        with open(args.spec) as f:
+            spec = json.load(f)
+        f = None
+        calls = product(args.n_candidates, args.seeds)
+        func = partial(generate_one, spec, n_tries=args.n_tries)
+        outputs = map_ordered(func, calls, n_workers=args.workers,
+                              chunk_size=1)
+
+    out = _open(args.output, 'w')
+    try:
+        _write_lines(outputs, out)
+    finally:
+        for stream in (f, out):
+            if stream not in (None, sys.stdin, sys.stdout):
+                stream.close()
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,379 @@
+"""A compact binary format for collections of games
+
+A corpus file holds many games with the same number of dimensions, and
+optionally the statements and solution of each game. The values of each
+dimension are stored once, in a dictionary, and candidates are stored as
+integer codes into these dictionaries, one column per dimension. Files are
+read through a read-only memory map, so processes that open the same corpus
+share its pages, and game i can be read without reading the games before it.
+
+Layout
+------
+All integers are in the byte order of the machine that wrote the file.
+
+    header      magic, version, byte order, number of dimensions, number of
+                games, number of candidates, size of the metadata
+    metadata    JSON with the player names, the value dictionaries and the
+                distinct lists of statements
+    offsets     uint64 per game, plus one: the first candidate of each game
+    statements  int32 per game: the index of its list of statements, or -1
+    solutions   int32 per game: the index of its solution among its
+                candidates, or -1
+    codes       uint32 per candidate, for each dimension in turn
+
+Each section starts at a multiple of 8 bytes.
+
+>>> import os, tempfile
+>>> from cheryl import Game, Statement, Knows
+>>> path = os.path.join(tempfile.mkdtemp(), 'games.corpus')
+>>> statements = [Statement(author='0', facts={'0': Knows.yes})]
+>>> with CorpusWriter(path, n_dims=2) as writer:
+...     writer.add(Game([(1, 'a'), (1, 'b'), (2, 'a')]), statements)
+...     writer.add(Game([(3, 'c'), (4, 'c')]))
+>>> corpus = Corpus(path)
+>>> len(corpus)
+2
+>>> sorted(corpus.game(0).candidates)
+[(1, 'a'), (1, 'b'), (2, 'a')]
+>>> corpus.solution(0)
+(2, 'a')
+>>> corpus.statements(1) is None
+True
+>>> corpus.close()
+"""
+
+from array import array
+import json
+import mmap
+import struct
+import sys
+import tempfile
+
+from cheryl import Game, statement_from_dict, Error, NoSolutionError
+
+
+MAGIC = b'CHERYLGC'
+VERSION = 1
+
+# magic, version, byte order, n_dims, n_games, n_rows, metadata size
+_HEADER = struct.Struct('<8sII QQQQ')
+
+
+class BadCorpusError(Error):
+    """A corpus file cannot be read, or a game does not fit the corpus"""
+    pass
+
+
+class CorpusWriter(object):
+    """Writes games to a corpus file, one at a time
+
+    Candidates are written to temporary files as games are added, so memory
+    use grows only with the number of games and of distinct values. The file
+    is complete once the writer is closed. If the writer is used as a context
+    manager and the block raises an exception, no file is written.
+
+    Attributes
+    ----------
+    path: str
+        The path of the corpus file.
+    n_dims: int
+        The number of dimensions of every game.
+    player_names: list of str
+        The names of the players of every game. If not given, the names of
+        the players of the first game.
+    """
+
+    def __init__(self, path, n_dims, player_names=None):
+        self.path = path
+        self.n_dims = n_dims
+        self.player_names = player_names
+
+        self._values = [[] for _ in range(n_dims)]
+        self._codes = [{} for _ in range(n_dims)]
+        self._columns = [tempfile.TemporaryFile() for _ in range(n_dims)]
+        self._statement_lists = []
+        self._statement_ids = {}
+
+        self._offsets = array('Q', [0])
+        self._statements = array('i')
+        self._solutions = array('i')
+
+    def add(self, game, statements=None, solution=None):
+        """Add a game
+
+        Parameters
+        ----------
+        game: Game
+            A game with values that JSON decodes to equal values of the same
+            type, like strings, numbers and booleans.
+        statements: list of Statement or Repeat
+            If given, the statements of the puzzle.
+        solution: tuple
+            The solution of the puzzle. If not given, but statements are, the
+            solution is worked out from them if it is unique.
+        """
+        if len(game.players) != self.n_dims:
+            msg = "Expected games with {} dimensions".format(self.n_dims)
+            raise BadCorpusError(msg)
+
+        if self.player_names is None:
+            self.player_names = game.get_player_names()
+        elif game.get_player_names() != list(self.player_names):
+            msg = "Expected games with players {}".format(self.player_names)
+            raise BadCorpusError(msg)
+
+        candidates = sorted(game.candidates)
+        columns = []
+        for dim in range(self.n_dims):
+            codes = self._codes[dim]
+            values = self._values[dim]
+            column_codes = array('I')
+            for cand in candidates:
+                code = codes.get(cand[dim])
+                if code is None:
+                    _check_value(cand[dim])
+                    code = codes[cand[dim]] = len(values)
+                    values.append(cand[dim])
+                column_codes.append(code)
+            columns.append(column_codes)
+
+        for column, column_codes in zip(self._columns, columns):
+            column.write(column_codes.tobytes())
+
+        if statements is None:
+            self._statements.append(-1)
+        else:
+            self._statements.append(self._get_statements_id(statements))
+            if solution is None:
+                try:
+                    solved = game.filter_chain(statements)
+                except NoSolutionError:
+                    solved = None
+                if solved is not None and len(solved.candidates) == 1:
+                    solution, = solved.candidates
+
+        if solution is None:
+            self._solutions.append(-1)
+        else:
+            self._solutions.append(candidates.index(tuple(solution)))
+
+        self._offsets.append(self._offsets[-1] + len(candidates))
+
+    def _get_statements_id(self, statements):
+        encoded = [statement.to_dict() for statement in statements]
+        key = json.dumps(encoded, sort_keys=True)
+        statements_id = self._statement_ids.get(key)
+        if statements_id is None:
+            statements_id = self._statement_ids[key] = \
+                    len(self._statement_lists)
+            self._statement_lists.append(encoded)
+        return statements_id
+
+    def close(self):
+        """Write the corpus file"""
+        if self._columns is None:
+            return
+
+        metadata = json.dumps({'player_names': self.player_names,
+                               'values': self._values,
+                               'statements': self._statement_lists}).encode()
+        n_rows = self._offsets[-1]
+        header = _HEADER.pack(MAGIC, VERSION, _byteorder_code(), self.n_dims,
+                              len(self._solutions), n_rows, len(metadata))
+
+        with open(self.path, 'wb') as f:
+            for section in [header, metadata, self._offsets.tobytes(),
+                            self._statements.tobytes(),
+                            self._solutions.tobytes()]:
+                f.write(section)
+                _pad(f)
+
+            for column in self._columns:
+                column.seek(0)
+                while True:
+                    block = column.read(1 << 20)
+                    if not block:
+                        break
+                    f.write(block)
+                column.close()
+                _pad(f)
+
+        self._columns = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        # do not leave an incomplete corpus behind
+        if exc_info[0] is None:
+            self.close()
+        elif self._columns is not None:
+            for column in self._columns:
+                column.close()
+            self._columns = None
+
+
+class Corpus(object):
+    """Reads games from a corpus file, building each Game when it is asked for
+
+    A Corpus can be sent to other processes, which open the file again and
+    share its pages through the memory map.
+
+    Attributes
+    ----------
+    path: str
+        The path of the corpus file.
+    engine: str
+        The engine of the games that are built.
+    player_names: list of str
+    n_dims: int
+    """
+
+    def __init__(self, path, engine='python'):
+        self.path = path
+        self.engine = engine
+        self._open()
+
+    def _open(self):
+        with open(self.path, 'rb') as f:
+            header = f.read(_HEADER.size)
+            if len(header) < _HEADER.size or header[:len(MAGIC)] != MAGIC:
+                msg = "{} is not a corpus file".format(self.path)
+                raise BadCorpusError(msg)
+
+            (_, version, byteorder, n_dims, n_games, n_rows,
+             metadata_size) = _HEADER.unpack(header)
+            if version != VERSION:
+                msg = "{} is a corpus file of version {}, not {}".format(
+                        self.path, version, VERSION)
+                raise BadCorpusError(msg)
+            elif byteorder != _byteorder_code():
+                msg = "{} was written with another byte order".format(
+                        self.path)
+                raise BadCorpusError(msg)
+
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        buffer = self._buffer = memoryview(self._mmap)
+
+        pos = _aligned(_HEADER.size)
+        metadata = json.loads(bytes(buffer[pos:pos + metadata_size]))
+        pos = _aligned(pos + metadata_size)
+
+        def section(fmt, n_items):
+            nonlocal pos
+            start, stop = pos, pos + n_items * struct.calcsize(fmt)
+            pos = _aligned(stop)
+            return buffer[start:stop].cast(fmt)
+
+        self._offsets = section('Q', n_games + 1)
+        self._statement_ids = section('i', n_games)
+        self._solutions = section('i', n_games)
+        self._columns = [section('I', n_rows) for _ in range(n_dims)]
+
+        self.n_dims = n_dims
+        self.player_names = metadata['player_names']
+        self._values = metadata['values']
+        self._statement_lists = metadata['statements']
+        self._decoded = {}
+
+    def __len__(self):
+        return len(self._solutions)
+
+    def candidates(self, i):
+        """Get the candidates of game i, as a list of tuples"""
+        start, stop = self._offsets[i], self._offsets[i + 1]
+        columns = [[values[code] for code in column[start:stop]]
+                   for values, column in zip(self._values, self._columns)]
+        return list(zip(*columns))
+
+    def game(self, i):
+        """Build game i"""
+        return Game(self.candidates(i), player_names=self.player_names,
+                    engine=self.engine)
+
+    def statements(self, i):
+        """Get the statements of game i, or None if it has none"""
+        statements_id = self._statement_ids[i]
+        if statements_id < 0:
+            return None
+
+        # decode each list once, so games that share it share the objects
+        statements = self._decoded.get(statements_id)
+        if statements is None:
+            statements = [statement_from_dict(data) for data in
+                          self._statement_lists[statements_id]]
+            self._decoded[statements_id] = statements
+        return statements
+
+    def solution(self, i):
+        """Get the solution of game i, or None if it has none"""
+        solution = self._solutions[i]
+        if solution < 0:
+            return None
+
+        row = self._offsets[i] + solution
+        return tuple(values[column[row]]
+                     for values, column in zip(self._values, self._columns))
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self.game(i)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.game(i)
+
+    def close(self):
+        """Release the memory map"""
+        views = [self._offsets, self._statement_ids, self._solutions]
+        for view in views + self._columns + [self._buffer]:
+            view.release()
+        self._mmap.close()
+
+    def __getstate__(self):
+        return {'path': self.path, 'engine': self.engine}
+
+    def __setstate__(self, state):
+        self.path = state['path']
+        self.engine = state['engine']
+        self._open()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __repr__(self):
+        return 'Corpus(path={path}, n_games={n})'.format(path=repr(self.path),
+                                                         n=len(self))
+
+
+def _check_value(value):
+    """Make sure a value is read back from the metadata as it was written"""
+    try:
+        decoded = json.loads(json.dumps(value))
+    except (TypeError, ValueError):
+        decoded = None
+    else:
+        if decoded == value and type(decoded) is type(value):
+            return
+
+    msg = "Value {!r} cannot be stored in a corpus".format(value)
+    raise BadCorpusError(msg)
+
+
+def _byteorder_code():
+    return 0 if sys.byteorder == 'little' else 1
+
+
+def _aligned(pos):
+    return -(-pos // 8) * 8
+
+
+def _pad(f):
+    f.write(b'\0' * (_aligned(f.tell()) - f.tell()))
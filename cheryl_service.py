@@ -0,0 +1,405 @@
+"""An asyncio service for solving and generating puzzles with cheryl
+
+Requests and responses are JSON objects, one per line, sent over a Unix
+socket or a TCP connection. Every request has an "id", which is copied to its
+response, and an "op":
+
+    {"id": 1, "op": "solve", "game": {"candidates": [...],
+     "player_names": [...]}, "statements": [...], "timeout": 5}
+    {"id": 2, "op": "find_game", "domains": [...], "n_candidates": 10,
+     "statements": [...], "n_tries": 100000, "seed": 123}
+    {"id": 3, "op": "cancel", "target": 2}
+
+Games and statements are encoded with `Game.to_dict` and `Statement.to_dict`.
+Responses are written as requests complete, so not necessarily in order, and
+are either {"id": ..., "result": ...} or {"id": ..., "error": {"type": ...,
+"message": ...}}.
+
+Usage
+-----
+    python cheryl_service.py --socket /tmp/cheryl.sock
+    python cheryl_service.py --port 8765 --workers 4
+"""
+
+import argparse
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import json
+import sys
+
+from cheryl import (Game, LRUCache, find_game, statement_from_dict,
+                    multiplicity_from_dict, error_to_dict, NoGameFoundError)
+
+
+# the largest request, in bytes
+DEFAULT_LIMIT = 64 * 1024 * 1024
+
+class SolverService(object):
+    """Solves and generates games in a pool of workers
+
+    Solve requests for the same game that arrive while the event loop is busy
+    are grouped, and evaluated together with `Game.evaluate_chains`, so their
+    shared statements are applied once. `find_game` searches are split into
+    chunks of tries, so that they can be cancelled or time out between
+    chunks, and so that the number of chunks running at once can be bounded.
+
+    Attributes
+    ----------
+    executor: concurrent.futures.Executor
+        The pool that the CPU work is run in.
+    chunk_size: int
+        The number of tries in each chunk of a `find_game` search.
+    max_searches: int
+        The largest number of `find_game` chunks to run at once, which leaves
+        workers free for solve requests.
+    n_batches: int
+        The number of batches of solve requests that were evaluated.
+    """
+
+    def __init__(self, executor=None, n_workers=None, chunk_size=500,
+                 max_searches=None):
+        if executor is None:
+            executor = ProcessPoolExecutor(n_workers)
+
+        self.executor = executor
+        self.chunk_size = chunk_size
+        self.max_searches = max_searches
+        self.n_batches = 0
+        self._batches = {}
+        self._searches = None
+
+    async def solve(self, game, statements, timeout=None):
+        """Apply statements to a game
+
+        Parameters
+        ----------
+        game: Game
+        statements: list of Statement or Repeat
+        timeout: float
+            If given, the number of seconds to wait for the result.
+
+        Returns
+        -------
+        ChainResult
+
+        Raises
+        ------
+        asyncio.TimeoutError, InvalidStatementError
+        """
+        # fail this request alone, not the batch it would be part of
+        game.compile(statements)
+
+        loop = asyncio.get_running_loop()
+        key = (game.candidates, tuple(game.get_player_names()), game.engine)
+
+        batch = self._batches.get(key)
+        if batch is None:
+            batch = self._batches[key] = (game, [], [])
+            loop.call_soon(self._run_batch, key)
+
+        future = loop.create_future()
+        batch[1].append(list(statements))
+        batch[2].append(future)
+        return await asyncio.wait_for(future, timeout)
+
+    def _run_batch(self, key):
+        game, chains, futures = self._batches.pop(key)
+        self.n_batches += 1
+
+        loop = asyncio.get_running_loop()
+        batch_future = loop.run_in_executor(self.executor,
+                                            game.evaluate_chains, chains)
+
+        def done(batch_future):
+            try:
+                results = batch_future.result()
+            except Exception as e:
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+
+            for future, result in zip(futures, results):
+                if not future.done():
+                    future.set_result(result)
+
+        batch_future.add_done_callback(done)
+
+    async def find_game(self, domains, n_candidates, statements, n_tries,
+                        player_names=None, seed=123, engine='python',
+                        multiplicity=None, timeout=None):
+        """Find a game that satisfies a given list of Statements
+
+        Takes the arguments of `cheryl.find_game`. Each chunk of tries is a
+        call to `cheryl.find_game` with a seed derived from `seed` and the
+        number of the chunk, so results are reproducible.
+
+        Parameters
+        ----------
+        timeout: float
+            If given, the number of seconds to search for.
+
+        Returns
+        -------
+        Game
+
+        Raises
+        ------
+        NoGameFoundError, asyncio.TimeoutError
+        """
+        search = self._search(domains, n_candidates, statements, n_tries,
+                              player_names, seed, engine, multiplicity)
+        return await asyncio.wait_for(search, timeout)
+
+    async def _search(self, domains, n_candidates, statements, n_tries,
+                      player_names, seed, engine, multiplicity):
+        loop = asyncio.get_running_loop()
+        if self._searches is None and self.max_searches is not None:
+            self._searches = asyncio.Semaphore(self.max_searches)
+
+        for chunk, start in enumerate(range(0, n_tries, self.chunk_size)):
+            chunk_tries = min(self.chunk_size, n_tries - start)
+            call = partial(find_game, domains, n_candidates, statements,
+                           chunk_tries, player_names=player_names,
+                           seed='{}-{}'.format(seed, chunk), engine=engine,
+                           multiplicity=multiplicity)
+            try:
+                if self._searches is None:
+                    return await loop.run_in_executor(self.executor, call)
+
+                async with self._searches:
+                    return await loop.run_in_executor(self.executor, call)
+            except NoGameFoundError:
+                continue
+
+        msg = "No game found in {} tries".format(n_tries)
+        raise NoGameFoundError(msg)
+
+    def close(self):
+        """Shut down the worker pool"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class _Connection(object):
+    """Reads the requests of one client and writes the responses"""
+
+    def __init__(self, service, reader, writer, statements, limit):
+        self.service = service
+        self.reader = reader
+        self.writer = writer
+        self.statements = statements
+        self.limit = limit
+        self.tasks = {}
+        self.replies = set()
+        self.lock = asyncio.Lock()
+
+    async def run(self):
+        while True:
+            line = await self.read_line()
+            if line is None:
+                msg = "Request is longer than {} bytes".format(self.limit)
+                await self.send(None, error=error_to_dict(ValueError(msg)))
+                continue
+            elif not line:
+                break
+            elif not line.strip():
+                continue
+
+            try:
+                request = json.loads(line)
+                request_id = request['id']
+            except (ValueError, TypeError, KeyError) as e:
+                await self.send(None, error=error_to_dict(e))
+                continue
+
+            # ids are used as keys, so only JSON scalars can be told apart
+            if not _is_scalar(request_id):
+                msg = "The id of a request must be a string, number or null"
+                await self.send(None, error=error_to_dict(TypeError(msg)))
+                continue
+
+            if request.get('op') == 'cancel':
+                target = request.get('target')
+                task = self.tasks.get(target) if _is_scalar(target) else None
+                if task is not None:
+                    task.cancel()
+                await self.send(request_id, result=task is not None)
+                continue
+
+            task = asyncio.ensure_future(self.handle(request))
+            self.tasks[request_id] = task
+
+            # the reply is sent by a task of its own, so that it is sent even
+            # if the request is cancelled before it starts
+            reply = asyncio.ensure_future(self.reply(request_id, task))
+            self.replies.add(reply)
+            reply.add_done_callback(self.replies.discard)
+
+        if self.replies:
+            await asyncio.wait(list(self.replies))
+        self.writer.close()
+
+    async def read_line(self):
+        """Read the next line
+
+        Returns
+        -------
+        The line, an empty bytes object at the end of the stream, or None if
+        the line was longer than the limit, in which case it is skipped.
+        """
+        try:
+            return await self.reader.readuntil(b'\n')
+        except asyncio.IncompleteReadError as e:
+            return e.partial
+        except asyncio.LimitOverrunError:
+            pass
+
+        while True:
+            try:
+                await self.reader.readuntil(b'\n')
+                return None
+            except asyncio.LimitOverrunError as e:
+                await self.reader.readexactly(e.consumed)
+            except asyncio.IncompleteReadError:
+                return None
+
+    async def reply(self, request_id, task):
+        await asyncio.wait([task])
+        if self.tasks.get(request_id) is task:
+            del self.tasks[request_id]
+
+        if task.cancelled():
+            await self.send(request_id,
+                            error=error_to_dict(asyncio.CancelledError()))
+        elif task.exception() is not None:
+            await self.send(request_id, error=error_to_dict(task.exception()))
+        else:
+            await self.send(request_id, result=task.result())
+
+    async def handle(self, request):
+        op = request.get('op')
+        statements = [self.get_statement(data)
+                      for data in request.get('statements', [])]
+
+        if op == 'solve':
+            game = Game.from_dict(request['game'],
+                                  engine=request.get('engine', 'python'))
+            result = await self.service.solve(game, statements,
+                                              timeout=request.get('timeout'))
+            return result.to_dict()
+
+        elif op == 'find_game':
+            game = await self.service.find_game(
+                    request['domains'], request['n_candidates'], statements,
+                    request['n_tries'],
+                    player_names=request.get('player_names'),
+                    seed=request.get('seed', 123),
+                    engine=request.get('engine', 'python'),
+                    multiplicity=multiplicity_from_dict(
+                            request.get('multiplicity')),
+                    timeout=request.get('timeout'))
+            return game.to_dict()
+
+        msg = "Unknown op '{}'".format(op)
+        raise ValueError(msg)
+
+    def get_statement(self, data):
+        """Decode a statement, reusing the object for an equal statement
+
+        Statements are told apart by identity when games are solved, so
+        reusing them lets requests share the work for shared statements.
+        """
+        key = json.dumps(data, sort_keys=True)
+        statement = self.statements.get(key)
+        if statement is None:
+            statement = statement_from_dict(data)
+            self.statements.put(key, statement)
+        return statement
+
+    async def send(self, request_id, result=None, error=None):
+        response = {'id': request_id}
+        if error is None:
+            response['result'] = result
+        else:
+            response['error'] = error
+
+        async with self.lock:
+            self.writer.write(json.dumps(response).encode() + b'\n')
+            await self.writer.drain()
+
+
+def _is_scalar(value):
+    return value is None or isinstance(value, (str, int, float))
+
+
+async def serve(service, path=None, host='127.0.0.1', port=8765,
+                limit=DEFAULT_LIMIT):
+    """Start serving requests
+
+    Parameters
+    ----------
+    service: SolverService
+    path: str
+        If given, the path of a Unix socket to listen on. Otherwise a TCP
+        port is listened on.
+    host: str
+    port: int
+    limit: int
+        The largest request, in bytes. Longer requests get an error response.
+
+    Returns
+    -------
+    asyncio.Server
+    """
+    statements = LRUCache(maxsize=4096)
+
+    async def handle(reader, writer):
+        await _Connection(service, reader, writer, statements, limit).run()
+
+    if path is not None:
+        return await asyncio.start_unix_server(handle, path=path, limit=limit)
+    return await asyncio.start_server(handle, host, port, limit=limit)
+
+
+async def _serve_forever(args):
+    service = SolverService(n_workers=args.workers, chunk_size=args.chunk_size,
+                            max_searches=args.max_searches)
+    server = await serve(service, path=args.socket, host=args.host,
+                         port=args.port, limit=args.limit)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--socket',
+                        help='the path of a Unix socket to listen on')
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='the host to listen on if no socket is given')
+    parser.add_argument('--port', type=int, default=8765,
+                        help='the port to listen on if no socket is given')
+    parser.add_argument('--limit', type=int, default=DEFAULT_LIMIT,
+                        help='largest request in bytes')
+    parser.add_argument('--workers', type=int,
+                        help='number of worker processes')
+    parser.add_argument('--chunk-size', type=int, default=500,
+                        help='number of find_game tries between checks for '
+                             'cancellation')
+    parser.add_argument('--max-searches', type=int,
+                        help='number of find_game chunks to run at once')
+    args = parser.parse_args(argv)
+
+    try:
+        asyncio.run(_serve_forever(args))
+    except KeyboardInterrupt:
+        pass
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,12 +1,30 @@
+from collections import Counter
 from copy import copy
+from itertools import product
+import json
+import os
 import random
+import subprocess
+import sys
 
 import pytest 
 
-from cheryl import (Player, Game, Knows, Statement,
+from cheryl import (Player, Game, Knows, Statement, StatementPlan, Repeat,
+                    LRUCache, ChainTrace, KnowledgeTable,
                     knows, knows_cases, find_game, sample_candidates,
-                    BadPlayerNamesError, InvalidStatementError, 
-                    NoGameFoundError, NoSolutionError, TooManyTriesError)
+                    enumerate_games, derive_multiplicity, find_dialogues,
+                    statement_pool, statement_from_dict,
+                    build_value_index, collect_stats, cache_filters,
+                    BadEngineError, BadPlayerNamesError, InvalidStatementError, 
+                    MultipleSolutionsError, NoGameFoundError, NoSolutionError,
+                    TooManyTriesError, IncompatibleArgumentsError)
+
+
+@pytest.fixture(params=['python', 'bitset', 'numpy'])
+def engine(request):
+    if request.param == 'numpy':
+        pytest.importorskip('numpy')
+    return request.param
 
 
 @pytest.fixture
@@ -36,6 +54,17 @@ def bigger_game():
     return game
 
 
+@pytest.fixture
+def chain_statements():
+    statements = [
+        Statement(author='0', facts={'0': Knows.no, ('1', '2'): Knows.maybe}),
+        Statement(author='1', facts={'1': Knows.no, '2': Knows.no}),
+        Statement(author='2', facts={'2': Knows.no, ('0', '1'): Knows.no}),
+        Statement(author='0', facts={'0': Knows.yes, '1': Knows.maybe}),
+        ]
+    return statements
+
+
 @pytest.fixture
 def candidates():
     candidates = [(0, 1, 3), (0, 5, 0), 
@@ -55,6 +84,14 @@ def solution_candidates():
     return candidates
 
 
+@pytest.fixture
+def found_candidates():
+    candidates = [(1930, 2, 17), (1931, 4, 10), (1931, 5, 19), (1931, 7, 11),
+                  (1936, 1, 17), (1936, 6, 13), (1937, 5, 17), (1938, 9, 15),
+                  (1939, 2, 17), (1939, 4, 19)]
+    return candidates
+
+
 def test_original_game_filters():
 
     candidates = [
@@ -139,6 +176,17 @@ def test_player_get_compatible(player):
     assert obs == [(3, 1, 1), (5, 1, 3)]
 
 
+def test_player_get_compatible_value_index(player, candidates):
+
+    index = build_value_index(candidates, 3)
+    truth = (0, 1, 3)
+
+    obs = player.get_compatible(truth=truth, candidates=candidates, 
+                                value_index=index)
+    exp = player.get_compatible(truth=truth, candidates=candidates)
+    assert sorted(obs) == sorted(exp)
+
+
 def test_player_view_sort(player):
 
     obs = player.view([(4, 4, 4, 4), (4, 2, 4, 4)])
@@ -236,6 +284,211 @@ def test_game_filter_all(bigger_game):
     assert game.candidates == set(all_candidates)
     
 
+def test_game_filter_shares_players(bigger_game):
+
+    game = bigger_game.filter(Statement('1', {'1': Knows.yes}))
+    assert isinstance(game.candidates, frozenset)
+    assert game.players is bigger_game.players
+    assert game.get_player_names() == bigger_game.get_player_names()
+    assert not hasattr(game, '__dict__')
+
+
+def test_game_filter_matches_true_for(bigger_game):
+
+    statements = [
+        Statement(author='0', facts={'0': Knows.no, '1': Knows.maybe}),
+        Statement(author='1', facts={'1': Knows.no, ('0', '2'): Knows.yes}),
+        Statement(author='2', facts={'0': Knows.no, ('0', '1'): Knows.no}),
+        ]
+
+    for statement in statements:
+        exp = [cand for cand in bigger_game.candidates 
+               if statement.true_for(cand, bigger_game)]
+        if exp:
+            assert bigger_game.filter(statement).candidates == set(exp)
+        else:
+            with pytest.raises(NoSolutionError):
+                bigger_game.filter(statement)
+
+
+def test_game_bad_engine(candidates):
+
+    with pytest.raises(BadEngineError):
+        Game(candidates, engine='fortran')
+
+
+def test_numpy_imported_lazily():
+
+    pytest.importorskip('numpy')
+
+    code = ('import sys, cheryl\n'
+            'assert "numpy" not in sys.modules\n'
+            'cheryl.Game([(1, 2)], engine="numpy")\n'
+            'assert "numpy" in sys.modules\n')
+    subprocess.check_call([sys.executable, '-c', code],
+                          cwd=os.path.dirname(os.path.abspath(__file__)))
+
+
+def reference_filter_chain(game, statements):
+    """Filter a game candidate by candidate, using Statement.true_for"""
+    for statement in statements:
+        filtered = [cand for cand in game.candidates
+                    if statement.true_for(cand, game)]
+        if not filtered:
+            raise NoSolutionError()
+        game = Game(filtered, game.get_player_names())
+    return game
+
+
+@pytest.mark.parametrize('n_statements', [1, 2, 3, 4])
+def test_game_engine_matches_true_for(chain_statements, n_statements, engine):
+
+    random.seed(n_statements)
+    domains = [range(5), range(6), range(4)]
+    statements = chain_statements[:n_statements]
+    for _ in range(50):
+        candidates = sample_candidates(domains, 12)
+        game = Game(candidates, engine=engine)
+
+        try:
+            exp = reference_filter_chain(Game(candidates), statements)
+        except NoSolutionError:
+            with pytest.raises(NoSolutionError):
+                game.filter_chain(statements)
+        else:
+            obs = game.filter_chain(statements)
+            assert obs.candidates == exp.candidates
+            assert obs.engine == engine
+
+
+def test_game_filter_chain_long():
+
+    # many rounds in which only a few candidates are removed at a time
+    candidates = [
+        (1970, 'May', 19), (1970, 'July', 18), (1971, 'May', 19),
+        (1971, 'July', 19), (1973, 'May', 18), (1973, 'June', 18),
+        (1973, 'Aug', 16), (1973, 'Aug', 18), (1974, 'June', 18),
+        (1974, 'Sept', 18)
+        ]
+    names = ['Albert', 'Bernard', 'Carl']
+    statements = [Statement(author=name, facts={name: Knows.no})
+                  for name in names * 3]
+    statements.append(Statement(author='Albert', facts={'Albert': Knows.yes}))
+
+    game = Game(candidates, player_names=names)
+    assert game.get_solution(statements) == (1970, 'May', 19)
+
+    for n_statements in range(1, len(statements)):
+        exp = reference_filter_chain(game, statements[:n_statements])
+        obs = game.filter_chain(statements[:n_statements])
+        assert obs.candidates == exp.candidates
+
+
+def test_game_repeat_matches_explicit_rounds(engine):
+
+    rng = random.Random(0)
+    names = ['0', '1', '2']
+    nobody_knows = [Statement(author=name, facts={name: Knows.no})
+                    for name in names]
+
+    for _ in range(50):
+        candidates = sample_candidates([range(4)] * 3, 12, rng=rng)
+        game = Game(candidates, engine=engine)
+        for n_rounds in range(1, 5):
+            exp = game.n_solutions(nobody_knows * n_rounds)
+            obs = game.n_solutions([Repeat(nobody_knows, n_rounds)])
+            assert obs == exp
+
+
+def test_game_repeat_readme():
+
+    candidates = [
+        (1970, 'May', 19), (1970, 'July', 18), (1971, 'May', 19),
+        (1971, 'July', 19), (1973, 'May', 18), (1973, 'June', 18),
+        (1973, 'Aug', 16), (1973, 'Aug', 18), (1974, 'June', 18),
+        (1974, 'Sept', 18)
+        ]
+    names = ['Albert', 'Bernard', 'Carl']
+    nobody_knows = Repeat([Statement(author=name, facts={name: Knows.no})
+                           for name in names], max_rounds=3)
+    statements = [nobody_knows,
+                  Statement(author='Albert', facts={'Albert': Knows.yes})]
+
+    game = Game(candidates, player_names=names)
+    assert game.get_solution(statements) == (1970, 'May', 19)
+
+
+def test_game_repeat_fixpoint():
+
+    game = Game([(1, 3), (1, 4), (2, 3), (2, 4), (3, 5)])
+    nobody_knows = Repeat([Statement(author='0', facts={'0': Knows.no}),
+                           Statement(author='1', facts={'1': Knows.no})],
+                          max_rounds=1000)
+
+    with collect_stats() as stats:
+        game = game.filter(nobody_knows)
+
+    # one round that rules out (3, 5) and one that rules out nothing
+    assert stats.n_applied == 4
+    assert [s.n_applied for s in stats.statements.values()] == [2, 2]
+    assert len(game.candidates) == 4
+
+
+def test_game_repeat_until():
+
+    game = Game([(1, 3), (1, 4), (2, 3), (2, 4), (3, 5)])
+    nobody_knows = Repeat([Statement(author='0', facts={'0': Knows.no})],
+                          max_rounds=10,
+                          until=Statement(author='1', facts={'1': Knows.yes}))
+
+    # player 1 would know for (3, 5), so no round is made
+    assert game.filter(nobody_knows) is game
+
+    with pytest.raises(InvalidStatementError):
+        Repeat([], max_rounds=1)
+
+    with pytest.raises(InvalidStatementError):
+        game.filter(Repeat([Statement(author='x', facts={})], max_rounds=1))
+
+
+def test_game_evaluate_chains(candidates, engine):
+
+    game = Game(candidates, engine=engine)
+    pool = statement_pool(['0', '1', '2'])[:8]
+    chains = [list(chain) for length in range(4)
+              for chain in product(pool[:4], repeat=length)]
+    chains.append([Repeat(pool[:2], max_rounds=3)] + pool[2:4])
+
+    with collect_stats() as stats:
+        results = game.evaluate_chains(chains)
+
+    for chain, result in zip(chains, results):
+        try:
+            exp = (1, game.get_solution(chain), None)
+        except NoSolutionError:
+            exp = (0, None, NoSolutionError)
+        except MultipleSolutionsError:
+            exp = (game.n_solutions(chain), None, MultipleSolutionsError)
+        assert (result.n_solutions, result.solution, result.error) == exp
+
+    # at most one statement applied per distinct prefix
+    n_prefixes = len(set(tuple(chain[:n]) for chain in chains 
+                         for n in range(1, len(chain) + 1)))
+    assert stats.n_applied <= n_prefixes + 2 * 3
+
+
+def test_game_signature_relabeled(candidates):
+
+    relabel = [{0: 'a', 1: 'b', 2: 'c', 4: 'd', 5: 'e'},
+               dict(zip(range(9), reversed(range(9)))),
+               dict(zip(range(10), range(10, 20)))]
+    relabeled = [tuple(relabel[dim][value] for dim, value in enumerate(cand))
+                 for cand in reversed(candidates)]
+
+    assert Game(candidates).signature() == Game(relabeled).signature()
+    assert Game(candidates).signature() != Game(candidates[1:]).signature()
+
+
 def test_game_get_solution(solution_candidates):
 
     game = Game(solution_candidates)
@@ -481,9 +734,42 @@ def test_statement_true_for_at_least_one_maybe():
     assert not statement.true_for(cand, game)
 
 
+def test_statement_compile():
+
+    facts = {('0', '2'): Knows.maybe, '2': Knows.no, '1': Knows.yes}
+    plan = Statement(author='1', facts=facts).compile(['0', '1', '2'])
+
+    assert plan.author == 1
+    assert plan.author_expected == Knows.yes
+    assert plan.facts == [((2,), Knows.no), ((0, 2), Knows.maybe)]
+
+
+def test_statement_compile_unknown_player():
+
+    statement = Statement(author='0', facts={'3': Knows.no})
+    with pytest.raises(InvalidStatementError):
+        statement.compile(['0', '1', '2'])
+
+
+def test_statement_plan_reused(bigger_game, candidates):
+
+    statements = [Statement(author='0', facts={'0': Knows.no}),
+                  Statement(author='1', facts={'1': Knows.no}),
+                  Statement(author='2', facts={'2': Knows.no})]
+    plans = bigger_game.compile(statements)
+
+    assert all(isinstance(plan, StatementPlan) for plan in plans)
+    assert bigger_game.n_solutions(plans) == 2
+    assert Game(candidates[1:]).n_solutions(plans) == \
+        Game(candidates[1:]).n_solutions(statements)
+
+    with pytest.raises(InvalidStatementError):
+        Game(candidates, player_names=['a', 'b', 'c']).filter(plans[0])
+
+
 # Module level functions
 #-----------------------
-def test_find_game_succeeds(solution_candidates):
+def test_find_game_succeeds(found_candidates):
 
     random.seed(123)
 
@@ -494,9 +780,9 @@ def test_find_game_succeeds(solution_candidates):
                   Statement(author='2', facts={'2': Knows.yes})]
     game = find_game(domains, n_candidates, statements, n_tries=100)
 
-    assert game.candidates == set(solution_candidates)
+    assert game.candidates == set(found_candidates)
 
-    assert game.get_solution(statements) == (1936, 7, 14)
+    assert game.get_solution(statements) == (1938, 9, 15)
      
 
 def test_find_game_fails():
@@ -513,7 +799,7 @@ def test_find_game_fails():
         game = find_game(domains, n_candidates, statements, n_tries=100)
 
 
-def test_find_game_with_names(solution_candidates):
+def test_find_game_with_names(found_candidates):
 
     random.seed(123)
 
@@ -525,11 +811,301 @@ def test_find_game_with_names(solution_candidates):
     game = find_game(domains, n_candidates, statements, n_tries=100,
                      player_names=['jim', 'jack', 'joe'])
 
-    assert game.candidates == set(solution_candidates)
+    assert game.candidates == set(found_candidates)
 
-    assert game.get_solution(statements) == (1936, 7, 14)
+    assert game.get_solution(statements) == (1938, 9, 15)
 
  
+def test_find_game_parallel_reproducible():
+
+    domains = [range(1930, 1940), range(1, 13), range(10, 20)]
+    statements = [Statement(author='0', facts={'0': Knows.yes}),
+                  Statement(author='1', facts={'1': Knows.yes}),
+                  Statement(author='2', facts={'2': Knows.yes})]
+
+    games = [find_game(domains, 10, statements, n_tries=100, seed=7,
+                       n_workers=2, chunk_size=chunk_size)
+             for chunk_size in [5, 5, 1, 3, 100]]
+
+    assert all(game.candidates == games[0].candidates for game in games)
+    assert games[0].n_solutions(statements) == 1
+
+
+def test_find_game_parallel_fails():
+
+    domains = [range(1930, 1940), range(1, 13), range(10, 20)]
+    statements = [Statement(author='0', facts={'0': Knows.no}),
+                  Statement(author='1', facts={'1': Knows.no}),
+                  Statement(author='2', facts={'2': Knows.no})]
+
+    messages = []
+    for _ in range(2):
+        with pytest.raises(NoGameFoundError) as excinfo:
+            find_game(domains, 10, statements, n_tries=30, n_workers=3,
+                      chunk_size=4)
+        messages.append(str(excinfo.value))
+
+    assert messages[0] == messages[1]
+    assert sum(eval(messages[0]).values()) == 30
+
+
+def test_find_game_batched():
+
+    pytest.importorskip('numpy')
+
+    domains = [range(1930, 1940), range(1, 13), range(10, 20)]
+    statements = [Statement(author='0', facts={'0': Knows.yes}),
+                  Statement(author='1', facts={'1': Knows.yes}),
+                  Statement(author='2', facts={'2': Knows.yes})]
+
+    games = [find_game(domains, 10, statements, n_tries=100, batch_size=16)
+             for _ in range(2)]
+
+    assert games[0].candidates == games[1].candidates
+    assert len(games[0].candidates) == 10
+    assert games[0].n_solutions(statements) == 1
+
+
+@pytest.mark.parametrize('sizes,n_candidates,n_games', [
+        ([4, 4, 4], 10, 16),            # dense keys
+        ([100, 100], 200, 16),          # without replacement
+        ([1000, 1000, 1000], 10, 16),   # resampling
+        ])
+def test_sample_codes(sizes, n_candidates, n_games):
+
+    np = pytest.importorskip('numpy')
+    from cheryl import _sample_codes
+
+    codes = _sample_codes(np.random.default_rng(1), sizes, n_candidates,
+                          n_games)
+
+    assert codes.shape == (n_games, n_candidates, len(sizes))
+    assert (codes >= 0).all() and (codes < sizes).all()
+    for game in codes:
+        candidates = [tuple(candidate) for candidate in game]
+        assert candidates == sorted(set(candidates))
+
+
+def test_sample_codes_too_many():
+
+    np = pytest.importorskip('numpy')
+    from cheryl import _sample_codes
+
+    with pytest.raises(TooManyTriesError, match='5 unique candidates out of 4'):
+        _sample_codes(np.random.default_rng(1), [2, 2], 5, 3)
+
+
+def test_find_game_batched_repeat():
+
+    pytest.importorskip('numpy')
+
+    domains = [range(1970, 1975), range(5), range(15, 20)]
+    nobody_knows = Repeat([Statement(author=name, facts={name: Knows.no})
+                           for name in ['0', '1', '2']], max_rounds=3)
+    statements = [nobody_knows, Statement(author='0', facts={'0': Knows.yes})]
+    explicit = nobody_knows.statements * 3 + statements[1:]
+
+    game = find_game(domains, 10, statements, n_tries=2000, batch_size=500)
+    assert game.n_solutions(explicit) == 1
+
+
+def test_find_game_batched_fails():
+
+    pytest.importorskip('numpy')
+
+    domains = [range(5), ['a', 'b', 'c', 'd'], range(5)]
+    statements = [
+        Statement(author='0', facts={'0': Knows.no, ('1', '2'): Knows.maybe}),
+        Statement(author='1', facts={'1': Knows.no}),
+        ]
+
+    with pytest.raises(NoGameFoundError) as excinfo:
+        find_game(domains, 8, statements, n_tries=50, batch_size=20)
+
+    n_solutions = eval(str(excinfo.value))
+    assert sum(n_solutions.values()) == 50
+    assert len(n_solutions) > 1
+
+
+def test_find_game_cache(found_candidates):
+
+    domains = [range(1930, 1940), range(1, 13), range(10, 20)]
+    statements = [Statement(author='0', facts={'0': Knows.yes}),
+                  Statement(author='1', facts={'1': Knows.yes}),
+                  Statement(author='2', facts={'2': Knows.yes})]
+
+    cache = LRUCache(maxsize=100)
+    game = find_game(domains, 10, statements, n_tries=100, cache=cache)
+    assert game.candidates == set(found_candidates)
+    assert len(cache) == cache.misses
+
+    # the same games are tried again, and all of them are cached
+    n_misses = cache.misses
+    find_game(domains, 10, statements, n_tries=100, cache=cache)
+    assert cache.misses == n_misses
+    assert cache.hits > 0
+
+
+def test_find_game_cache_player_names():
+
+    domains = [range(3), range(6)]
+    statements = [Statement(author='a', facts={'a': Knows.yes})]
+
+    # the same games mean something else when the names are swapped
+    cache = LRUCache(maxsize=1000)
+    game = find_game(domains, 4, statements, 50, player_names=['a', 'b'],
+                     cache=cache, seed=1)
+    assert game.n_solutions(statements) == 1
+    with pytest.raises(NoGameFoundError):
+        find_game(domains, 4, statements, 50, player_names=['b', 'a'],
+                  cache=cache, seed=1)
+
+
+def test_find_game_cache_gives_up():
+
+    # no two games are alike, so looking them up never saves any time
+    domains = [range(1000)] * 3
+    statements = [Statement(author='0', facts={'0': Knows.yes})]
+
+    cache = LRUCache(maxsize=10000)
+    with pytest.raises(NoGameFoundError):
+        find_game(domains, 10, statements, n_tries=500, cache=cache)
+    # the cache is only looked up for the first few games
+    assert cache.hits + cache.misses <= 3 * 20
+
+
+def test_lru_cache():
+
+    cache = LRUCache(maxsize=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+
+    assert 'b' not in cache
+    assert cache.get('b') is None
+    assert cache.get('c') == 3
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_lru_cache_maxbytes():
+
+    # keys are counted as well as values
+    cache = LRUCache(maxbytes=10, sizeof=len)
+    cache.put('a', 'xxxx')
+    cache.put('b', 'xxxx')
+    assert cache.nbytes == 10
+    cache.put('c', 'xxxx')
+
+    assert 'a' not in cache
+    assert len(cache) == 2
+    assert cache.nbytes == 10
+
+    cache.put('b', 'x')
+    assert cache.nbytes == 7
+
+    cache.put('d', 'x' * 20)
+    assert len(cache) == 0
+    assert cache.nbytes == 0
+
+
+def test_cache_filters_counts_keys(bigger_game):
+
+    statement = Statement(author='0', facts={'0': Knows.no})
+    with cache_filters(LRUCache()) as cache:
+        filtered = bigger_game.filter(statement)
+
+    # the candidates in the key are counted, not just the result
+    assert cache.nbytes > sys.getsizeof(bigger_game.candidates) + \
+        sys.getsizeof(filtered.candidates)
+
+
+def test_cache_filters_matches_uncached(chain_statements, engine):
+
+    rng = random.Random(0)
+    for _ in range(20):
+        candidates = sample_candidates([range(4)] * 3, 12, rng=rng)
+        game = Game(candidates, engine=engine)
+        exp = [game.n_solutions(chain_statements[:n]) for n in range(1, 5)]
+
+        with cache_filters() as cache:
+            for _ in range(2):
+                obs = [game.n_solutions(chain_statements[:n])
+                       for n in range(1, 5)]
+                assert obs == exp
+
+        # only the first time a prefix is seen is it worked out
+        assert cache.misses <= 4
+
+
+def test_cache_filters_shared_prefix(bigger_game):
+
+    prefix = [Statement(author='0', facts={'0': Knows.no})]
+    endings = [Statement(author='1', facts={'1': Knows.yes}),
+               Statement(author='2', facts={'2': Knows.yes})]
+
+    with collect_stats() as stats:
+        with cache_filters() as cache:
+            for ending in endings:
+                bigger_game.n_solutions(prefix + [ending])
+            game = bigger_game.filter(prefix[0])
+
+    assert cache.hits == 2
+    assert stats.n_applied == 3
+    assert game.candidates == bigger_game.filter(prefix[0]).candidates
+
+    with cache_filters(LRUCache(maxsize=1)) as cache:
+        with pytest.raises(NoSolutionError):
+            Game([(1, 2), (1, 3)]).filter(
+                    Statement(author='0', facts={'0': Knows.yes}))
+        with pytest.raises(NoSolutionError):
+            Game([(1, 2), (1, 3)]).filter(
+                    Statement(author='0', facts={'0': Knows.yes}))
+
+    # each Statement object is a different key
+    assert cache.hits == 0
+
+
+def test_enumerate_games_non_isomorphic():
+
+    domains = [range(3), range(3), range(2)]
+    games = list(enumerate_games(domains, 4))
+
+    # one game for every structure, checked against all subsets
+    all_positions = [(x, y, z) for x in range(3) for y in range(3) 
+                     for z in range(2)]
+    random.seed(123)
+    signatures = set(Game(random.sample(all_positions, 4)).signature()
+                     for _ in range(2000))
+
+    game_signatures = set(game.signature() for game in games)
+    assert len(game_signatures) == len(games)
+    assert signatures <= game_signatures
+
+
+def test_enumerate_games_statements():
+
+    statements = [Statement(author='0', facts={'0': Knows.no, '1': Knows.no}),
+                  Statement(author='1', facts={'1': Knows.yes}),
+                  Statement(author='0', facts={'0': Knows.yes})]
+    domains = [range(4), range(4)]
+
+    games = list(enumerate_games(domains, 7, statements))
+    assert len(games) == 5
+    assert all(game.n_solutions(statements) == 1 for game in games)
+
+
+def test_enumerate_games_resume():
+
+    domains = [range(3), range(3)]
+    games = list(enumerate_games(domains, 4))
+    resumed = list(enumerate_games(domains, 4, 
+                                   resume_after=list(games[2].candidates)))
+
+    assert [game.candidates for game in resumed] == \
+        [game.candidates for game in games[3:]]
+
+
 def test_sample_candidates_fails():
 
     domains = [[0, 1], ['a', 'b']]
@@ -537,6 +1113,36 @@ def test_sample_candidates_fails():
         sample_candidates(domains, 5)
 
 
+def test_sample_candidates_all():
+
+    domains = [range(3), 'abc', range(4)]
+    candidates = sample_candidates(domains, 36, rng=random.Random(1))
+
+    assert candidates == sorted(set(candidates))
+    assert len(candidates) == 36
+
+
+def test_sample_candidates_max_tries_positional():
+
+    domains = [range(10), range(10)]
+    random.seed(1)
+    positional = sample_candidates(domains, 5, 100)
+    random.seed(1)
+    keyword = sample_candidates(domains, 5, max_tries=100)
+
+    assert positional == keyword
+
+
+def test_sample_candidates_reproducible():
+
+    domains = [range(10 ** 6), range(10 ** 6), range(10 ** 6)]
+    samples = [sample_candidates(domains, 10, rng=random.Random(1))
+               for _ in range(2)]
+
+    assert samples[0] == samples[1]
+    assert len(set(samples[0])) == 10
+
+
 def test_knows_yes():
 
     assert knows([(1, 3, 4)]) == Knows.yes
@@ -560,3 +1166,376 @@ def test_knows_cases_no():
 def test_knows_cases_maybe():
 
     assert knows_cases([Knows.yes, Knows.no]) == Knows.maybe
+
+
+def test_build_value_index(candidates):
+
+    index = build_value_index(candidates, 3)
+
+    assert sorted(index[0][4]) == [(4, 0, 2), (4, 1, 0), (4, 2, 9)]
+    assert index[1][7] == [(2, 7, 9)]
+    assert sum(len(group) for group in index[2].values()) == len(candidates)
+
+
+def test_sample_candidates_multiplicity():
+
+    domains = [range(10), range(10), range(3)]
+    rng = random.Random(1)
+    for _ in range(20):
+        candidates = sample_candidates(domains, 9, rng=rng, 
+                                       multiplicity={0: (2, 3), 2: (3, 3)})
+
+        assert len(set(candidates)) == 9
+        counts = Counter(c[0] for c in candidates)
+        assert all(2 <= n <= 3 for n in counts.values())
+        assert sorted(Counter(c[2] for c in candidates).values()) == [3, 3, 3]
+
+
+def test_sample_candidates_multiplicity_fails():
+
+    with pytest.raises(TooManyTriesError):
+        sample_candidates([range(2), range(10)], 7, multiplicity={0: (2, 3)})
+
+
+def test_derive_multiplicity():
+
+    statements = [Statement(author='jack', facts={'jack': Knows.no, 
+                                                  'jim': Knows.maybe}),
+                  Statement(author='jim', facts={'jim': Knows.no})]
+
+    assert derive_multiplicity(statements, ['jim', 'jack']) == \
+        {1: (2, float('inf'))}
+    assert derive_multiplicity(statements[1:], ['jim', 'jack']) == \
+        {0: (2, float('inf'))}
+    assert derive_multiplicity([]) == {}
+
+    with pytest.raises(InvalidStatementError):
+        derive_multiplicity(statements, ['jim', 'joe'])
+    with pytest.raises(InvalidStatementError):
+        derive_multiplicity(statements)
+
+
+def test_find_game_multiplicity_auto():
+
+    domains = [range(1970, 1975), range(5), range(15, 20)]
+    statements = [Statement(author='0', facts={'0': Knows.no}),
+                  Statement(author='1', facts={'1': Knows.no}),
+                  Statement(author='2', facts={'2': Knows.no}),
+                  Statement(author='0', facts={'0': Knows.yes})]
+
+    game = find_game(domains, 10, statements, n_tries=1000, 
+                     multiplicity='auto')
+
+    assert game.n_solutions(statements) == 1
+    assert min(Counter(c[0] for c in game.candidates).values()) >= 2
+
+    with pytest.raises(IncompatibleArgumentsError):
+        find_game(domains, 10, statements, n_tries=10, batch_size=10,
+                  multiplicity='auto')
+
+
+def test_collect_stats_filter_chain(found_candidates, engine):
+
+    game = Game(found_candidates, engine=engine)
+    statements = [Statement(author='0', facts={'0': Knows.yes}),
+                  Statement(author='1', facts={'1': Knows.yes}),
+                  Statement(author='2', facts={'2': Knows.yes})]
+
+    with collect_stats() as stats:
+        game.filter_chain(statements)
+
+    totals = list(stats.statements.values())
+    assert list(stats.statements) == statements
+    assert [s.statement for s in totals] == statements
+    assert all(s.n_applied == 1 for s in totals)
+    n_alive = [s.n_after for s in totals]
+    assert [s.n_before for s in totals] == [10] + n_alive[:-1]
+    assert sum(s.n_removed for s in totals) == 10 - n_alive[-1]
+    assert all(s.seconds >= 0 for s in totals)
+    assert stats.candidates_scanned == sum(s.n_before for s in totals)
+
+
+def test_collect_stats_no_solution():
+
+    game = Game([(1, 2), (1, 3)])
+    statement = Statement(author='0', facts={'0': Knows.yes})
+
+    with collect_stats() as stats:
+        with pytest.raises(NoSolutionError):
+            game.filter(statement)
+
+    assert [(s.n_before, s.n_after)
+            for s in stats.statements.values()] == [(2, 0)]
+
+
+def test_collect_stats_true_for(candidates):
+
+    game = Game(candidates)
+    statement = Statement(author='0', facts={'0': Knows.no, '1': Knows.no})
+
+    with collect_stats() as stats:
+        statement.true_for(candidates[0], game)
+        statement.true_for(candidates[1], game)
+
+    # the knowledge table is built once, by scanning the candidates
+    assert stats.true_for_calls == 2
+    assert stats.candidates_scanned == len(candidates)
+
+
+def test_collect_stats_find_game(chain_statements):
+
+    domains = [range(1970, 1975), range(5), range(15, 20)]
+
+    with collect_stats() as stats:
+        with pytest.raises(NoGameFoundError):
+            find_game(domains, 10, chain_statements, n_tries=5)
+
+    assert stats.n_tries == 5
+    assert stats.find_game_seconds > 0
+    assert stats.tries_per_second > 0
+
+
+def test_collect_stats_off():
+
+    with collect_stats() as outer:
+        with collect_stats() as inner:
+            Game([(1, 2), (1, 3)]).filter(
+                    Statement(author='0', facts={'0': Knows.no}))
+
+    assert len(inner.statements) == 1
+    assert len(outer.statements) == 0
+
+
+def test_find_dialogues_matches_naive(candidates, engine):
+
+    game = Game([cand[:2] for cand in candidates], engine=engine)
+    pool = statement_pool(['0', '1'])
+
+    # the shortest length of the sequences that lead to each solution
+    exp = {}
+    for length in range(1, 4):
+        for dialogue in product(pool, repeat=length):
+            try:
+                solved = game.filter_chain(dialogue)
+            except NoSolutionError:
+                continue
+            if len(solved.candidates) == 1:
+                solution, = solved.candidates
+                exp.setdefault(solution, length)
+
+    found = list(find_dialogues(game, pool, 3))
+    assert {solution: len(dialogue) for dialogue, solution in found} == exp
+    assert [len(dialogue) for dialogue, _ in found] == \
+        sorted(len(dialogue) for dialogue, _ in found)
+
+    for dialogue, solution in found:
+        assert game.get_solution(dialogue) == solution
+
+
+def test_find_dialogues_prunes(candidates):
+
+    game = Game(candidates)
+    pool = statement_pool(['0', '1', '2'])
+
+    with collect_stats() as stats:
+        list(find_dialogues(game, pool, 4))
+
+    # far fewer statements are applied than there are sequences of length 3
+    assert stats.n_applied < len(pool) ** 3
+    # one entry per statement, however often it is applied
+    assert len(stats.statements) <= len(pool)
+
+
+def test_statement_pool():
+
+    pool = statement_pool(['a', 'b', 'c'], knows_values=list(Knows))
+
+    # 2 for the author alone, and 2 * 3 for each of the 2 other players
+    assert len(pool) == 3 * (2 + 2 * 3 * 2)
+    assert all(stmt.facts[stmt.author] != Knows.maybe for stmt in pool)
+
+
+def test_to_dict_round_trip(bigger_game):
+
+    statements = [
+        Statement(author='0', facts={'0': Knows.no, ('1', '2'): Knows.maybe}),
+        Repeat([Statement(author='1', facts={'1': Knows.no})], max_rounds=2,
+               until=Statement(author='2', facts={'2': Knows.yes})),
+        ]
+
+    data = json.loads(json.dumps({
+            'game': bigger_game.to_dict(),
+            'statements': [statement.to_dict() for statement in statements]
+            }))
+    game = Game.from_dict(data['game'])
+    decoded = [statement_from_dict(statement) 
+               for statement in data['statements']]
+
+    assert game.candidates == bigger_game.candidates
+    assert game.get_player_names() == bigger_game.get_player_names()
+    assert [statement.to_dict() for statement in decoded] == \
+        data['statements']
+    assert game.n_solutions(decoded) == bigger_game.n_solutions(statements)
+
+    with pytest.raises(InvalidStatementError):
+        statement_from_dict({'author': '0', 'facts': [['0', 'perhaps']]})
+
+
+def test_repr_truncated(monkeypatch):
+
+    monkeypatch.setattr(Game, 'repr_max_rows', 10)
+    game = Game([(i, i % 7) for i in range(250)])
+
+    lines = repr(game).splitlines()
+    assert len(lines) == 1 + 10 + 1
+    assert lines[-1] == '... and 240 more candidates'
+    assert lines[1:-1] == game.render(stop=10).splitlines()[1:]
+
+
+def test_derived_game_render(engine):
+
+    candidates = sample_candidates([range(20)] * 3, 300,
+                                   rng=random.Random(0))
+    game = Game(candidates, engine=engine)
+    repr(game)
+    statement = Statement(author='0', facts={'0': Knows.no})
+    derived = game.filter(statement)
+
+    # laid out like its parent, and sorted like a fresh game
+    assert derived._widths is game._widths
+    fresh = Game(list(derived.candidates), engine=engine)
+    fresh._widths = game._widths
+    assert derived.render(stop=5) == fresh.render(stop=5)
+    assert derived.render() == fresh.render()
+    assert derived.render(start=3, stop=8) == fresh.render(start=3, stop=8)
+
+
+def test_derived_game_layout_order():
+
+    candidates = [(1, 'a'), (1, 'bbbbbb'), (22222, 'c'), (3, 'c')]
+    statement = Statement(author='0', facts={'0': Knows.no})
+
+    # the layout does not depend on whether the parent was shown first
+    game = Game(candidates)
+    derived_first = repr(game.filter(statement))
+    game = Game(candidates)
+    repr(game)
+    assert repr(game.filter(statement)) == derived_first
+
+
+def test_render_pages(bigger_game):
+
+    full = bigger_game.render().splitlines()
+    header, rows = full[0], full[1:]
+    pages = [bigger_game.render(start=start, stop=start + 3).splitlines()
+             for start in range(0, len(rows), 3)]
+
+    assert all(page[0] == header for page in pages)
+    assert [row for page in pages for row in page[1:]] == rows
+
+
+def test_trace_chain_replay(engine):
+
+    candidates = sample_candidates([range(8)] * 3, 16, rng=random.Random(3))
+    game = Game(candidates, engine=engine)
+    statements = [
+        Repeat([Statement(author='0', facts={'0': Knows.no}),
+                Statement(author='1', facts={'1': Knows.no,
+                                             '2': Knows.maybe})],
+               max_rounds=5),
+        Statement(author='2', facts={'2': Knows.yes}),
+        ]
+    trace = game.trace_chain(statements)
+
+    assert isinstance(trace, ChainTrace)
+    assert trace.error is None
+    assert trace.replay(0) is game
+    assert trace.replay().candidates == \
+        game.filter_chain(statements).candidates
+
+    # each step picks up where the one before left off
+    for n, step in enumerate(trace.steps):
+        before = trace.replay(n)
+        assert step.n_before == len(before.candidates)
+        after = before.filter(step.statement)
+        assert after.candidates == trace.replay(n + 1).candidates
+
+        for who, removed in step.removed.items():
+            assert who in step.statement.facts
+            assert not any(step.statement.true_for(cand, before)
+                           for cand in removed)
+
+
+def test_trace_chain_reasons(bigger_game):
+
+    statement = Statement(author='0', facts={'0': Knows.no,
+                                             ('1', '2'): Knows.maybe})
+    step, = bigger_game.trace_chain([statement]).steps
+
+    # every group of the author has more than one candidate, so only the
+    # fact about the tuple can be false
+    assert list(step.removed) == [('1', '2')]
+    assert sorted(step.removed[('1', '2')]) == [(5, 1, 8), (5, 4, 1)]
+    assert step.n_after == len(bigger_game.filter(statement).candidates)
+
+
+def test_trace_chain_no_solution(bigger_game, chain_statements):
+
+    trace = bigger_game.trace_chain(chain_statements)
+
+    with pytest.raises(NoSolutionError):
+        bigger_game.filter_chain(chain_statements)
+    assert trace.error is NoSolutionError
+    assert trace.steps[-1].n_after == 0
+    with pytest.raises(NoSolutionError):
+        trace.replay()
+    trace.replay(len(trace) - 1)
+
+
+def test_knowledge_table_matches_players(bigger_game):
+
+    table = bigger_game.knowledge
+    candidates = bigger_game.candidates
+    value_index = bigger_game.value_index
+
+    assert bigger_game.knowledge is table
+    for cand in candidates:
+        for author in bigger_game.players:
+            truths = author.get_compatible(cand, candidates, value_index)
+            assert table.group_size(author.index, cand) == len(truths)
+            assert table.knows(author.index, cand) == knows(truths)
+            for player in bigger_game.players:
+                assert table.would_know(author.index, player.index, cand) == \
+                    player.would_know(truths, candidates, value_index)
+
+
+def test_knowledge_table_possible(bigger_game):
+
+    pool = statement_pool(bigger_game.get_player_names())
+    table = KnowledgeTable(bigger_game.candidates,
+                           bigger_game.get_player_names())
+
+    for statement in pool:
+        assert table.possible(statement) == \
+            (bigger_game.n_solutions([statement]) > 0)
+
+    with pytest.raises(InvalidStatementError):
+        table.possible(Repeat(pool[:1], max_rounds=2))
+
+
+def test_knowledge_table_missing_value():
+
+    game = Game([(1, 2), (1, 3), (2, 3)])
+    author_no = Statement(author='0', facts={'0': Knows.no})
+    other_yes = Statement(author='0', facts={'1': Knows.yes})
+
+    assert not author_no.true_for((5, 5), game)
+    assert other_yes.true_for((5, 5), game)
+    assert game.knowledge.group_size(0, (5, 5)) == 0
+    assert game.knowledge.knows(0, (5, 5)) == Knows.no
+
+    # statements are compiled once per table
+    game.knowledge.true_for(author_no, (1, 2))
+    plan = game.knowledge._plans[author_no]
+    game.knowledge.true_for(author_no, (2, 3))
+    assert game.knowledge._plans[author_no] is plan
@@ -0,0 +1,101 @@
+from collections import Counter
+import json
+
+import pytest
+
+from cheryl import Game, Knows, Statement
+from cheryl_batch import main, map_ordered
+
+
+@pytest.fixture
+def puzzles():
+    game = Game([('May', 15), ('May', 16), ('May', 19), ('June', 17),
+                 ('June', 18), ('July', 14), ('July', 16), ('Aug', 14),
+                 ('Aug', 15), ('Aug', 17)],
+                player_names=['Albert', 'Bernard'])
+    statements = [
+        Statement(author='Albert',
+                  facts={'Albert': Knows.no, 'Bernard': Knows.no}),
+        Statement(author='Bernard', facts={'Bernard': Knows.yes}),
+        Statement(author='Albert', facts={'Albert': Knows.yes}),
+        ]
+
+    puzzles = []
+    for n in range(4):
+        puzzle = game.to_dict()
+        puzzle['id'] = n
+        puzzle['statements'] = [stmt.to_dict() for stmt in statements[:n]]
+        puzzles.append(json.dumps(puzzle))
+    puzzles.append('{"id": 4, "candidates": []}')
+    puzzles.extend(['[1, 2]', 'null'])
+    return puzzles
+
+
+@pytest.mark.parametrize('n_workers', [0, 2])
+def test_solve(puzzles, tmp_path, n_workers):
+
+    path = tmp_path / 'puzzles.jsonl'
+    path.write_text('\n'.join(puzzles * 10) + '\n')
+    output = tmp_path / 'results.jsonl'
+
+    assert main(['--workers', str(n_workers), '--chunk-size', '3',
+                 '-o', str(output), 'solve', str(path)]) == 0
+
+    results = [json.loads(line) for line in output.read_text().splitlines()]
+    assert len(results) == 70
+    assert [result.get('id') for result in results[:5]] == [0, 1, 2, 3, 4]
+    assert [result.get('n_solutions') for result in results[:4]] == \
+        [10, 5, 3, 1]
+    assert results[3]['solution'] == ['July', 16]
+    assert results[2]['error'] == 'MultipleSolutionsError'
+    assert 'error' in results[4]
+    assert results[5]['error']['type'] == 'TypeError'
+    assert results[6]['error']['type'] == 'TypeError'
+    assert results[7:14] == results[:7]
+
+
+def test_generate(tmp_path):
+
+    spec = {'domains': [list(range(1930, 1940)), list(range(1, 13)),
+                        list(range(10, 20))],
+            'statements': [{'author': str(i), 'facts': [[str(i), 'yes']]}
+                           for i in range(3)]}
+    path = tmp_path / 'spec.json'
+    path.write_text(json.dumps(spec))
+    output = tmp_path / 'games.jsonl'
+
+    assert main(['--workers', '0', '-o', str(output), 'generate', str(path),
+                 '--n-candidates', '10', '3', '--seeds', '1', '2',
+                 '--n-tries', '100']) == 0
+
+    results = [json.loads(line) for line in output.read_text().splitlines()]
+    assert [(r['n_candidates'], r['seed']) for r in results] == \
+        [(10, 1), (10, 2), (3, 1), (3, 2)]
+    assert len(results[0]['game']['candidates']) == 10
+    assert results[0]['solution'] in results[0]['game']['candidates']
+
+
+def test_generate_multiplicity(tmp_path):
+
+    spec = {'domains': [list(range(6)), list(range(4))],
+            'statements': [{'author': '0', 'facts': [['0', 'no']]},
+                           {'author': '1', 'facts': [['1', 'yes']]}],
+            'multiplicity': {'0': [3, 3]}}
+    path = tmp_path / 'spec.json'
+    path.write_text(json.dumps(spec))
+    output = tmp_path / 'games.jsonl'
+
+    assert main(['--workers', '0', '-o', str(output), 'generate', str(path),
+                 '--n-candidates', '9', '--seeds', '1', '2', '3']) == 0
+
+    for line in output.read_text().splitlines():
+        result = json.loads(line)
+        counts = Counter(cand[0] for cand in result['game']['candidates'])
+        assert set(counts.values()) == {3}
+
+
+def test_map_ordered():
+
+    results = map_ordered(abs, ((-n,) for n in range(100)), n_workers=2,
+                          chunk_size=7, max_pending=2)
+    assert list(results) == list(range(100))
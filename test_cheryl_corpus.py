@@ -0,0 +1,126 @@
+from concurrent.futures import ProcessPoolExecutor
+import pickle
+import random
+
+import pytest
+
+from cheryl import Game, Knows, Statement, sample_candidates
+from cheryl_corpus import Corpus, CorpusWriter, BadCorpusError
+
+
+@pytest.fixture
+def games():
+    rng = random.Random(0)
+    domains = [range(1970, 1975), ['May', 'June', 'July', 'Aug'],
+               range(15, 20)]
+    return [Game(sample_candidates(domains, rng.randint(3, 12), rng=rng),
+                 player_names=['Albert', 'Bernard', 'Carl'])
+            for _ in range(50)]
+
+
+@pytest.fixture
+def statements():
+    return [Statement(author='Albert', facts={'Albert': Knows.no}),
+            Statement(author='Bernard', facts={'Bernard': Knows.yes})]
+
+
+def write_corpus(path, games, statements):
+    with CorpusWriter(path, n_dims=3) as writer:
+        for i, game in enumerate(games):
+            writer.add(game, statements if i % 2 else None)
+
+
+def test_corpus_round_trip(games, statements, tmp_path):
+
+    path = str(tmp_path / 'games.corpus')
+    write_corpus(path, games, statements)
+
+    with Corpus(path, engine='bitset') as corpus:
+        assert len(corpus) == len(games)
+        assert corpus.player_names == ['Albert', 'Bernard', 'Carl']
+
+        for i in [17, 3, 49, 0, -1]:
+            game = corpus[i]
+            assert game.candidates == games[i].candidates
+            assert game.engine == 'bitset'
+
+        for i, game in enumerate(games):
+            if i % 2:
+                assert corpus.statements(i) is corpus.statements(1)
+                n_solutions = game.n_solutions(statements)
+                if n_solutions == 1:
+                    assert corpus.solution(i) == game.get_solution(statements)
+                else:
+                    assert corpus.solution(i) is None
+            else:
+                assert corpus.statements(i) is None
+                assert corpus.solution(i) is None
+
+        with pytest.raises(IndexError):
+            corpus[len(games)]
+
+
+def count_solutions(corpus, i):
+    return corpus.game(i).n_solutions(corpus.statements(i))
+
+
+def test_corpus_shared_between_processes(games, statements, tmp_path):
+
+    path = str(tmp_path / 'games.corpus')
+    write_corpus(path, games, statements)
+
+    corpus = Corpus(path)
+    assert pickle.loads(pickle.dumps(corpus)).game(5).candidates == \
+        games[5].candidates
+
+    indices = range(1, len(games), 2)
+    with ProcessPoolExecutor(2) as executor:
+        obs = list(executor.map(count_solutions, [corpus] * len(indices),
+                                indices))
+    assert obs == [games[i].n_solutions(statements) for i in indices]
+    corpus.close()
+
+
+def test_corpus_errors(games, tmp_path):
+
+    path = tmp_path / 'not.corpus'
+    for data in [b'', b'not a corpus file' * 10]:
+        path.write_bytes(data)
+        with pytest.raises(BadCorpusError):
+            Corpus(str(path))
+
+    path = tmp_path / 'games.corpus'
+    with pytest.raises(BadCorpusError):
+        with CorpusWriter(str(path), n_dims=2) as writer:
+            writer.add(games[0])
+    assert not path.exists()
+
+    renamed = Game(sorted(games[1].candidates), player_names=['A', 'B', 'C'])
+    with pytest.raises(BadCorpusError):
+        with CorpusWriter(str(path), n_dims=3) as writer:
+            writer.add(games[0])
+            writer.add(renamed)
+    assert not path.exists()
+
+    with pytest.raises(BadCorpusError):
+        with CorpusWriter(str(path), n_dims=3,
+                          player_names=['A', 'B', 'C']) as writer:
+            writer.add(games[0])
+
+
+def test_corpus_values_round_trip(games, tmp_path):
+
+    path = str(tmp_path / 'games.corpus')
+    bad_games = [Game([((1, 2), 'a'), ((3, 4), 'b')]),
+                 Game([(object(), 'a')]),
+                 Game([(1.5, 'a'), (float('nan'), 'b')])]
+
+    with CorpusWriter(path, n_dims=2) as writer:
+        for game in bad_games:
+            with pytest.raises(BadCorpusError):
+                writer.add(game)
+        writer.add(Game([(1, 'a'), (2.5, 'b'), (3, None)]))
+
+    with Corpus(path) as corpus:
+        assert len(corpus) == 1
+        assert corpus.candidates(0) == [(1, 'a'), (2.5, 'b'), (3, None)]
@@ -0,0 +1,173 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import json
+
+import pytest
+
+from cheryl import Game, Knows, Statement, NoGameFoundError
+from cheryl_service import SolverService, serve
+
+
+@pytest.fixture
+def service():
+    service = SolverService(executor=ThreadPoolExecutor(2), chunk_size=50)
+    yield service
+    service.close()
+
+
+@pytest.fixture
+def birthday():
+    candidates = [('May', 15), ('May', 16), ('May', 19), ('June', 17),
+                  ('June', 18), ('July', 14), ('July', 16), ('Aug', 14),
+                  ('Aug', 15), ('Aug', 17)]
+    game = Game(candidates, player_names=['Albert', 'Bernard'])
+    statements = [
+        Statement(author='Albert',
+                  facts={'Albert': Knows.no, 'Bernard': Knows.no}),
+        Statement(author='Bernard', facts={'Bernard': Knows.yes}),
+        Statement(author='Albert', facts={'Albert': Knows.yes}),
+        ]
+    return game, statements
+
+
+def test_solve_groups_requests(service, birthday):
+
+    game, statements = birthday
+
+    async def solve_all():
+        return await asyncio.gather(
+                *[service.solve(game, statements[:n]) for n in range(1, 4)])
+
+    results = asyncio.run(solve_all())
+
+    assert [result.n_solutions for result in results] == [5, 3, 1]
+    assert results[2].solution == ('July', 16)
+    assert service.n_batches == 1
+
+
+def test_find_game(service):
+
+    domains = [range(1930, 1940), range(1, 13), range(10, 20)]
+    statements = [Statement(author='0', facts={'0': Knows.yes}),
+                  Statement(author='1', facts={'1': Knows.yes}),
+                  Statement(author='2', facts={'2': Knows.yes})]
+
+    game = asyncio.run(service.find_game(domains, 10, statements, 200))
+    assert game.n_solutions(statements) == 1
+
+
+def test_find_game_timeout(service):
+
+    # nobody can know about a value that all candidates share
+    domains = [range(1), range(100), range(100)]
+    statements = [Statement(author='0', facts={'0': Knows.yes})]
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(service.find_game(domains, 10, statements, 10 ** 9,
+                                      timeout=0.2))
+
+    with pytest.raises(NoGameFoundError):
+        asyncio.run(service.find_game(domains, 10, statements, 100))
+
+
+def test_serve(service, birthday, tmp_path):
+
+    game, statements = birthday
+    path = str(tmp_path / 'cheryl.sock')
+    requests = [
+        {'id': 1, 'op': 'solve', 'game': game.to_dict(),
+         'statements': [statement.to_dict() for statement in statements]},
+        {'id': 2, 'op': 'find_game', 'domains': [[0], list(range(100))],
+         'n_candidates': 10, 'n_tries': 10 ** 9,
+         'statements': [{'author': '0', 'facts': [['0', 'yes']]}]},
+        {'id': 3, 'op': 'cancel', 'target': 2},
+        {'id': 4, 'op': 'solve', 'game': game.to_dict(),
+         'statements': [{'author': 'Carl', 'facts': []}]},
+        ]
+
+    async def talk():
+        server = await serve(service, path=path)
+        async with server:
+            reader, writer = await asyncio.open_unix_connection(path)
+            for request in requests:
+                writer.write(json.dumps(request).encode() + b'\n')
+            writer.write_eof()
+
+            responses = {}
+            async for line in reader:
+                response = json.loads(line)
+                responses[response['id']] = response
+            writer.close()
+            return responses
+
+    responses = asyncio.run(talk())
+
+    assert responses[1]['result'] == {'n_solutions': 1,
+                                      'solution': ['July', 16],
+                                      'error': None}
+    assert responses[2]['error']['type'] == 'CancelledError'
+    assert responses[3]['result'] is True
+    assert responses[4]['error']['type'] == 'InvalidStatementError'
+
+
+def test_serve_long_request(service, birthday, tmp_path):
+
+    game, statements = birthday
+    path = str(tmp_path / 'cheryl.sock')
+    big = Game([(i, i % 7) for i in range(500)])
+    requests = [
+        {'id': 1, 'op': 'solve', 'game': big.to_dict(), 'statements': []},
+        {'id': 2, 'op': 'solve', 'game': game.to_dict(),
+         'statements': [statement.to_dict() for statement in statements]},
+        ]
+
+    async def talk():
+        server = await serve(service, path=path, limit=1024)
+        async with server:
+            reader, writer = await asyncio.open_unix_connection(path)
+            for request in requests:
+                writer.write(json.dumps(request).encode() + b'\n')
+            writer.write_eof()
+
+            responses = [json.loads(line) async for line in reader]
+            writer.close()
+            return responses
+
+    long_response, response = asyncio.run(talk())
+
+    assert long_response['id'] is None
+    assert long_response['error']['type'] == 'ValueError'
+    assert response['id'] == 2
+    assert response['result']['solution'] == ['July', 16]
+
+
+def test_serve_bad_id(service, birthday, tmp_path):
+
+    game, statements = birthday
+    path = str(tmp_path / 'cheryl.sock')
+    requests = [
+        {'id': [1], 'op': 'solve', 'game': game.to_dict(), 'statements': []},
+        {'id': 2, 'op': 'cancel', 'target': {'id': 1}},
+        {'id': 3, 'op': 'solve', 'game': game.to_dict(),
+         'statements': [statement.to_dict() for statement in statements]},
+        ]
+
+    async def talk():
+        server = await serve(service, path=path)
+        async with server:
+            reader, writer = await asyncio.open_unix_connection(path)
+            for request in requests:
+                writer.write(json.dumps(request).encode() + b'\n')
+            writer.write_eof()
+
+            responses = [json.loads(line) async for line in reader]
+            writer.close()
+            return responses
+
+    bad_response, cancel_response, response = asyncio.run(talk())
+
+    assert bad_response['id'] is None
+    assert bad_response['error']['type'] == 'TypeError'
+    assert cancel_response == {'id': 2, 'result': False}
+    assert response['id'] == 3
+    assert response['result']['solution'] == ['July', 16]